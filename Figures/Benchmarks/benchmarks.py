@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+from copy import deepcopy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from Figures.Code.figures import Triangle, Square, Rectangle, Circle, RandomFigureFactory, FigureFactory, StreamFigureFactory
+
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+DEFAULT_THRESHOLD = 0.2
+
+
+def rejection_triangle():
+    while True:
+        a = round(random.uniform(1, 100), 2)
+        b = round(random.uniform(1, 100), 2)
+        c = round(random.uniform(1, 100), 2)
+        if a + b > c and a + c > b and b + c > a:
+            return Triangle(a, b, c)
+
+
+def rejection_triangle_columns(generator, count):
+    a, b, c = (np.round(generator.uniform(1, 100, count), 2) for _ in range(3))
+    invalid = ~((a + b > c) & (a + c > b) & (b + c > a))
+    while invalid.any():
+        redraw = np.flatnonzero(invalid)
+        for column in (a, b, c):
+            column[redraw] = np.round(generator.uniform(1, 100, len(redraw)), 2)
+        invalid[redraw] = ~((a[redraw] + b[redraw] > c[redraw]) & (a[redraw] + c[redraw] > b[redraw]) & (b[redraw] + c[redraw] > a[redraw]))
+    return a, b, c
+
+
+def throughput(function, count, repeat=5):
+    seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+    return count / seconds
+
+
+def synthetic_lines(count, seed=0):
+    random.seed(seed)
+    # A fixed pool of distinct lines keeps the memory of the 10^7 runs bounded.
+    pool = [str(figure) for figure in RandomFigureFactory().iter_random_figures(min(count, 100000))]
+    return [pool[i % len(pool)] for i in range(count)]
+
+
+def synthetic_figures(count, seed=0):
+    return [FigureFactory.create_figure(line) for line in synthetic_lines(count, seed)]
+
+
+def drain_stream(path):
+    with open(path, "r") as stream:
+        return sum(1 for _ in StreamFigureFactory(stream, "file", max_figures=None))
+
+
+def suite_create_figure(count):
+    lines = synthetic_lines(count)
+    create = FigureFactory.create_figure
+    return lambda: [create(line) for line in lines]
+
+
+def suite_stream(count):
+    handle, path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(handle, "w") as file:
+        file.write("\n".join(synthetic_lines(count)) + "\n")
+    return lambda: drain_stream(path), lambda: os.remove(path)
+
+
+def suite_random(count):
+    factory = RandomFigureFactory()
+    if count <= 1000:
+        return lambda: factory.create_random_figures(count)
+    return lambda: list(factory.iter_random_figures(count))
+
+
+def suite_perimeter(count):
+    figures = synthetic_figures(count)
+    return lambda: [figure.get_perimeter() for figure in figures]
+
+
+def suite_clone(count):
+    figures = synthetic_figures(count)
+    return lambda: [figure.clone() for figure in figures]
+
+
+SUITE = {
+    'create_figure': suite_create_figure,
+    'stream': suite_stream,
+    'random': suite_random,
+    'perimeter': suite_perimeter,
+    'clone': suite_clone,
+}
+
+
+def run_suite(sizes=DEFAULT_SIZES, names=None, repeat=5, report=None):
+    results = {}
+    for name, build in SUITE.items():
+        if names and name not in names:
+            continue
+        results[name] = {}
+        for size in sizes:
+            built = build(size)
+            function, cleanup = built if isinstance(built, tuple) else (built, None)
+            try:
+                # Large sizes take seconds per run, so they get fewer repeats.
+                rate = throughput(function, size, repeat=max(1, min(repeat, 10 ** 6 // size)))
+            finally:
+                if cleanup is not None:
+                    cleanup()
+            results[name][str(size)] = rate
+            if report is not None:
+                report(f'{name} [{size:,}]: {rate:,.0f} figures/s')
+    return results
+
+
+def save_baseline(results, path):
+    baseline = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'numpy': None if np is None else np.__version__,
+        'results': results,
+    }
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for name, sizes in results.items():
+        for size, rate in sizes.items():
+            reference = baseline.get(name, {}).get(size)
+            if reference and rate < reference * (1 - threshold):
+                regressions.append((name, int(size), reference, rate))
+    return regressions
+
+
+def bench_triangle_sampling(count=100000):
+    results = {
+        'rejection loop': throughput(lambda: [rejection_triangle() for _ in range(count)], count),
+        'rejection-free': throughput(lambda: [RandomFigureFactory._create_random_triangle() for _ in range(count)], count),
+    }
+    if np is not None:
+        generator = np.random.default_rng()
+        results['rejection loop (batch)'] = throughput(lambda: rejection_triangle_columns(generator, count * 10), count * 10)
+        results['rejection-free (batch)'] = throughput(lambda: Triangle.random_columns(generator, count * 10), count * 10)
+    return results
+
+
+def bench_clone(count=100000):
+    results = {}
+    for figure in (Triangle(3, 4, 5), Square(4), Rectangle(8, 5), Circle(7)):
+        name = type(figure).__name__.lower()
+        results[f'{name} deepcopy'] = throughput(lambda: [deepcopy(figure) for _ in range(count)], count)
+        results[f'{name} clone'] = throughput(lambda: [figure.clone() for _ in range(count)], count)
+        results[f'{name} clone_many'] = throughput(lambda: figure.clone_many(count), count)
+        if np is not None:
+            results[f'{name} clone_many (batch)'] = throughput(lambda: figure.clone_many(count * 10, as_batch=True), count * 10)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m Figures.Benchmarks.benchmarks')
+    parser.add_argument('--sizes', metavar='N', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='collection sizes to run, e.g. --sizes 1000 10000000 (default: 10^3 to 10^6)')
+    parser.add_argument('--only', metavar='NAME', nargs='+', choices=sorted(SUITE), help='run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=5, help='best-of repeats for each measurement')
+    parser.add_argument('--save', metavar='FILE', help='store the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='fail if throughput dropped against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed relative throughput drop for --compare (default: 0.2)')
+    parser.add_argument('--implementations', action='store_true',
+                        help='also compare the triangle samplers and the clone implementations')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.only, args.repeat, report=print)
+    if args.implementations:
+        for name, rate in bench_triangle_sampling().items():
+            print(f'triangle sampling, {name}: {rate:,.0f} triangles/s')
+        for name, rate in bench_clone().items():
+            print(f'clone, {name}: {rate:,.0f} figures/s')
+    if args.save:
+        save_baseline(results, args.save)
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)['results']
+        regressions = compare_results(results, baseline, args.threshold)
+        for name, size, reference, rate in regressions:
+            print(f'REGRESSION {name} [{size:,}]: {rate:,.0f} figures/s, baseline {reference:,.0f} '
+                  f'({rate / reference - 1:+.0%})', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,286 @@
-import math, sys, random
+import math, sys, random, os, mmap, weakref, bisect, struct, zlib, time, socket, threading, signal, stat, select
 from abc import ABC, abstractmethod
-from copy import deepcopy
+from collections import deque, OrderedDict, Counter
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
 import inspect
+import asyncio
+import argparse
+import json
+from io import StringIO
+import cProfile
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+VALID = 0
+INVALID_TYPE = 1
+NOT_POSITIVE = 2
+TOO_BIG = 3
+INEQUALITY_VIOLATED = 4
+INVALID_VALUE = 5
+
+BINARY_MAGIC = b'FIGB'
+BINARY_VERSION = 1
+BINARY_ZLIB = 1
+_BINARY_HEADER = struct.Struct('<4sHHQI4x')
+_BINARY_TYPE = struct.Struct('<HHQ')
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('NumPy is required for batch operations on figures!')
+
+
+def _round_many(values, digits):
+    # np.round scales by 10**digits, which can land on the wrong side of a tie, while the
+    # built-in round() rounds the exact binary value. Only values whose scaled form is
+    # within a few ulps of a .5 tie can differ, so those few are redone with round().
+    scaled = values * 10.0 ** digits
+    rounded = np.rint(scaled) / 10.0 ** digits
+    fraction = scaled - np.floor(scaled)
+    near_tie = np.abs(fraction - 0.5) <= np.maximum(1e-6, 8 * np.spacing(np.abs(scaled)))
+    if near_tie.any():
+        rows = np.flatnonzero(near_tie)
+        rounded[rows] = [round(value, digits) for value in values[rows].tolist()]
+    return rounded
+
+
+def _numeric_columns(*columns):
+    _require_numpy()
+    columns = [np.asarray(column) for column in columns]
+    count = len(columns[0]) if columns else 0
+    codes = np.zeros(count, dtype=np.uint8)
+    converted = []
+    for column in columns:
+        if len(column) != count:
+            raise ValueError('All columns must have the same length!')
+        if column.dtype.kind in 'biuf':
+            converted.append(column.astype(np.float64, copy=False))
+            continue
+        if column.dtype.kind == 'O':
+            numeric = np.fromiter((isinstance(value, (int, float)) for value in column), dtype=bool, count=count)
+        else:
+            numeric = np.zeros(count, dtype=bool)
+        codes[~numeric] = INVALID_TYPE
+        values = np.full(count, np.nan)
+        values[numeric] = column[numeric].astype(np.float64)
+        converted.append(values)
+    return converted, codes
+
+
+class FigureType:
+    __slots__ = ('name', 'cls', 'arity', 'params', 'ranges', 'validator')
+
+    def __init__(self, name, cls, params, ranges, validator):
+        self.name = name
+        self.cls = cls
+        self.arity = len(params)
+        self.params = params
+        self.ranges = ranges
+        self.validator = validator
+
+    def __repr__(self):
+        return f'FigureType({self.name!r}, {self.cls.__name__}, arity={self.arity})'
+
+
+class FigureRegistry:
+    _types = {}
+    _by_class = {}
+    _entries = ()
+    _classes = ()
+
+    @classmethod
+    def register(cls, figure_class, name=None):
+        name = (name or figure_class.__name__).lower()
+        constructor = inspect.signature(figure_class.__init__)
+        params = tuple(
+            param.name for param in constructor.parameters.values() if param.name != "self"
+        )
+        ranges = getattr(figure_class, 'random_ranges', None) or ((1, 2000),) * len(params)
+        if len(ranges) != len(params):
+            raise ValueError(f'{figure_class.__name__} needs one random range per parameter!')
+        validator = getattr(figure_class, 'validate', None)
+
+        previous = cls._types.get(name)
+        if previous is not None:
+            cls._by_class.pop(previous.cls, None)
+        entry = FigureType(name, figure_class, params, tuple(ranges), validator)
+        cls._types[name] = entry
+        cls._by_class[figure_class] = entry
+        cls._refresh()
+        return figure_class
+
+    @classmethod
+    def unregister(cls, name):
+        entry = cls._types.pop(name.lower(), None)
+        if entry is not None:
+            cls._by_class.pop(entry.cls, None)
+        cls._refresh()
+        return entry
+
+    @classmethod
+    def refresh(cls, figure_class):
+        entry = cls._by_class.get(figure_class)
+        if entry is None:
+            raise ValueError(f'Unknown or invalid figure type: {figure_class.__name__}')
+        return cls.register(figure_class, entry.name)
+
+    @classmethod
+    def _refresh(cls):
+        cls._entries = tuple(cls._types.values())
+        cls._classes = tuple(entry.cls for entry in cls._entries)
+
+    @classmethod
+    def get(cls, name):
+        return cls._types.get(name.lower())
+
+    @classmethod
+    def of(cls, figure_class):
+        return cls._by_class.get(figure_class)
+
+    @classmethod
+    def names(cls):
+        return tuple(cls._types)
+
+    @classmethod
+    def types(cls):
+        return cls._entries
+
+    @classmethod
+    def schema(cls):
+        return {
+            entry.name: {'params': list(entry.params), 'ranges': [list(limits) for limits in entry.ranges]}
+            for entry in cls._entries
+        }
+
+    @classmethod
+    def figure_classes(cls):
+        return cls._classes
+
+
+def _is_abstract(figure_class):
+    for base in figure_class.__mro__[1:]:
+        for name in getattr(base, '__abstractmethods__', ()):
+            if getattr(getattr(figure_class, name, None), '__isabstractmethod__', False):
+                return True
+    return any(getattr(value, '__isabstractmethod__', False) for value in vars(figure_class).values())
 
 
 class Figure(ABC):
+    # Concrete figures list their own fields in __slots__, so instances get no __dict__.
+    # __weakref__ stays because FigureInternPool holds figures through weak references.
+    __slots__ = ('__weakref__',)
+
+    def __init_subclass__(cls, register=True, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if register and not _is_abstract(cls):
+            FigureRegistry.register(cls)
+
     @abstractmethod
     def get_perimeter(self):
         pass
 
+    @abstractmethod
+    def get_area(self):
+        pass
+
+    @property
+    def dimensions(self):
+        entry = FigureRegistry.of(type(self))
+        if entry is None:
+            raise AttributeError(f'{type(self).__name__} is not registered and does not define dimensions')
+        return tuple(getattr(self, name) for name in entry.params)
+
+    # Plugins that are not registered, or keep their fields under other names and do not
+    # override dimensions, have no readable value and compare and hash by identity.
+    def _value(self):
+        try:
+            return self.dimensions
+        except AttributeError:
+            return None
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        value = self._value()
+        if value is None:
+            return self is other
+        return value == other._value()
+
+    def __hash__(self):
+        value = self._value()
+        if value is None:
+            return object.__hash__(self)
+        return hash((type(self), value))
+
+    @classmethod
+    def validate_many(cls, *columns):
+        _require_numpy()
+        count = len(columns[0]) if columns else 0
+        codes = np.zeros(count, dtype=np.uint8)
+        validator = getattr(cls, 'validate', None)
+        if validator is not None:
+            for i, row in enumerate(zip(*(list(column) for column in columns))):
+                try:
+                    validator(*row)
+                except TypeError:
+                    codes[i] = INVALID_TYPE
+                except OverflowError:
+                    codes[i] = TOO_BIG
+                except ValueError:
+                    codes[i] = INVALID_VALUE
+        return codes == VALID, codes
+
+    @classmethod
+    def random_columns(cls, generator, count):
+        ranges = FigureRegistry.of(cls).ranges
+        return tuple(np.round(generator.uniform(low, high, count), 2) for low, high in ranges)
+
+    @classmethod
+    def perimeter_many(cls, *columns):
+        _require_numpy()
+        count = len(columns[0]) if columns else 0
+        perimeters = (cls(*row).get_perimeter() for row in zip(*(column.tolist() for column in columns)))
+        return np.fromiter(perimeters, dtype=np.float64, count=count)
+
+    @classmethod
+    def area_many(cls, *columns):
+        _require_numpy()
+        count = len(columns[0]) if columns else 0
+        areas = (cls(*row).get_area() for row in zip(*(column.tolist() for column in columns)))
+        return np.fromiter(areas, dtype=np.float64, count=count)
+
+    @classmethod
+    def format_many(cls, *columns):
+        return [str(cls(*row)) for row in zip(*(column.tolist() for column in columns))]
+
     def __str__(self):
         pass
 
 class Prototype(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def clone(self):
         pass
 
+    def clone_many(self, count, as_batch=False):
+        if count < 0:
+            raise ValueError('The number of clones cannot be negative!')
+        if as_batch:
+            _require_numpy()
+            columns = tuple(np.full(count, value, dtype=np.float64) for value in self.dimensions)
+            return FigureBatch((FigureRegistry.of(type(self)),), np.zeros(count, dtype=np.uint8), [columns])
+        clone = self.clone
+        return [clone() for _ in range(count)]
+
 class AbstractFigureFactory:
     @staticmethod
     def get_factory(input_type):
@@ -36,9 +300,117 @@ class AbstractFigureFactory:
         else:
             raise ValueError(f"Invalid input type: {input_type}")
 
+class FigureInternPool:
+    def __init__(self):
+        self._figures = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._figures)
+
+    def get(self, figure_class, dimensions):
+        figure = self._figures.get((figure_class, dimensions))
+        if figure is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return figure
+
+    def add(self, figure):
+        return self._figures.setdefault((type(figure), figure.dimensions), figure)
+
+    def intern(self, figure):
+        existing = self.get(type(figure), figure.dimensions)
+        return self.add(figure) if existing is None else existing
+
+
+class ParseCache:
+    def __init__(self, maxsize=1024):
+        if maxsize <= 0:
+            raise ValueError('The cache size must be positive!')
+        self.maxsize = maxsize
+        self._figures = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._figures)
+
+    @staticmethod
+    def normalize(figure_str):
+        return ' '.join(figure_str.split()).lower()
+
+    def get(self, key):
+        figure = self._figures.get(key)
+        if figure is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._figures.move_to_end(key)
+        return figure
+
+    def put(self, key, figure):
+        self._figures[key] = figure
+        self._figures.move_to_end(key)
+        if len(self._figures) > self.maxsize:
+            self._figures.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._figures.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._figures), 'maxsize': self.maxsize}
+
+
+class StageTimer:
+    STAGES = ('read', 'tokenize', 'lookup', 'validate', 'format')
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.calls = dict.fromkeys(self.STAGES, 0)
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    @contextmanager
+    def stage(self, stage):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add(stage, self.clock() - start)
+
+    def summary(self):
+        return {stage: {'seconds': self.seconds[stage], 'calls': self.calls[stage]} for stage in self.seconds}
+
+    def report(self):
+        total = sum(self.seconds.values()) or 1.0
+        lines = [f'{"stage":<10}{"calls":>12}{"seconds":>12}{"share":>8}']
+        for stage, seconds in self.seconds.items():
+            lines.append(f'{stage:<10}{self.calls[stage]:>12,}{seconds:>12.4f}{seconds / total:>8.1%}')
+        return '\n'.join(lines)
+
+
 class FigureFactory:
     @staticmethod
-    def create_figure(figure_str):
+    def create_figure(figure_str, pool=None, cache=None, timer=None):
+        if timer is not None:
+            return FigureFactory._create_figure_timed(figure_str, pool, cache, timer)
+        if cache is not None:
+            key = ParseCache.normalize(figure_str)
+            figure = cache.get(key)
+            if figure is None:
+                figure = FigureFactory.create_figure(figure_str, pool=pool)
+                cache.put(key, figure)
+            return figure
+
         parts = figure_str.split()
         if len(parts) < 2:
             raise ValueError('Invalid input format!')
@@ -46,15 +418,80 @@ class FigureFactory:
         figure_type = parts[0].capitalize()
         dimensions = list(map(float, parts[1:]))
 
-        figure_class = globals().get(figure_type)
+        entry = FigureRegistry.get(parts[0])
 
-        if not figure_class or not issubclass(figure_class, Figure):
+        if entry is None:
             raise ValueError(f'Unknown or invalid figure type: {figure_type}')
+        if len(dimensions) != entry.arity:
+            raise ValueError(f'Incorrect parameters for {figure_type}: {dimensions}')
+
+        if pool is not None:
+            figure = pool.get(entry.cls, tuple(dimensions))
+            if figure is not None:
+                return figure
 
         try:
-            return figure_class(*dimensions)
+            figure = entry.cls(*dimensions)
         except TypeError as e:
             raise ValueError(f'Incorrect parameters for {figure_type}: {dimensions}') from e
+        return figure if pool is None else pool.add(figure)
+
+    @staticmethod
+    def _tokenize(figure_str):
+        parts = figure_str.split()
+        if len(parts) < 2:
+            raise ValueError('Invalid input format!')
+        return parts[0], parts[0].capitalize(), list(map(float, parts[1:]))
+
+    @staticmethod
+    def _lookup(name, figure_type, dimensions, pool):
+        entry = FigureRegistry.get(name)
+        if entry is None:
+            raise ValueError(f'Unknown or invalid figure type: {figure_type}')
+        if len(dimensions) != entry.arity:
+            raise ValueError(f'Incorrect parameters for {figure_type}: {dimensions}')
+        return entry, None if pool is None else pool.get(entry.cls, tuple(dimensions))
+
+    @staticmethod
+    def _construct(entry, figure_type, dimensions, pool):
+        try:
+            figure = entry.cls(*dimensions)
+        except TypeError as e:
+            raise ValueError(f'Incorrect parameters for {figure_type}: {dimensions}') from e
+        return figure if pool is None else pool.add(figure)
+
+    # The create_figure steps, each wrapped in the clock for the stage a StageTimer reports.
+    # The untimed path keeps them inline so that it pays no extra calls; keep both in step.
+    @staticmethod
+    def _create_figure_timed(figure_str, pool, cache, timer):
+        clock = timer.clock
+        if cache is not None:
+            start = clock()
+            key = ParseCache.normalize(figure_str)
+            figure = cache.get(key)
+            timer.add('lookup', clock() - start)
+            if figure is None:
+                figure = FigureFactory._create_figure_timed(figure_str, pool, None, timer)
+                cache.put(key, figure)
+            return figure
+
+        start = clock()
+        try:
+            name, figure_type, dimensions = FigureFactory._tokenize(figure_str)
+        finally:
+            tokenized = clock()
+            timer.add('tokenize', tokenized - start)
+        try:
+            entry, figure = FigureFactory._lookup(name, figure_type, dimensions, pool)
+        finally:
+            looked_up = clock()
+            timer.add('lookup', looked_up - tokenized)
+        if figure is not None:
+            return figure
+        try:
+            return FigureFactory._construct(entry, figure_type, dimensions, pool)
+        finally:
+            timer.add('validate', clock() - looked_up)
 
 class RandomFigureFactory:
     def create_random_figures(self, num_figures):
@@ -63,55 +500,196 @@ class RandomFigureFactory:
         if num_figures > 1000:
             raise OverflowError('The number of figures cannot be greater than 1000!')
 
-        figure_classes = [
-            cls for cls in globals().values()
-            if inspect.isclass(cls) and issubclass(cls, Figure) and cls != Figure
-        ]
+        return list(self.iter_random_figures(num_figures))
+
+    def iter_random_figures(self, num_figures, chunk_size=None):
+        if num_figures <= 0:
+            raise ValueError('The number of figures must be positive!')
+        if chunk_size is not None:
+            if chunk_size <= 0:
+                raise ValueError('The chunk size must be positive!')
+            for start in range(0, num_figures, chunk_size):
+                yield list(self.iter_random_figures(min(chunk_size, num_figures - start)))
+            return
+
+        figure_types = list(FigureRegistry.types())
 
-        figures = []
         for _ in range(num_figures):
-            figure_class = random.choice(figure_classes)
+            entry = random.choice(figure_types)
+            figure_class = entry.cls
 
-            if figure_class.__name__.lower() == "triangle":
-                figures.append(self._create_random_triangle())
+            if entry.name == "triangle":
+                yield self._create_random_triangle()
                 continue
 
-            constructor = inspect.signature(figure_class.__init__)
-            param_count = len([
-                param for param in constructor.parameters.values() if param.name != "self"
-            ])
-
-            random_params = [round(random.uniform(1, 2000), 2) for _ in range(param_count)]
+            random_params = [round(random.uniform(low, high), 2) for low, high in entry.ranges]
             try:
-                figures.append(figure_class(*random_params))
+                yield figure_class(*random_params)
             except TypeError as e:
                 raise ValueError(f"Could not create figure: {figure_class.__name__} with parameters {random_params}") from e
 
-        return figures
+    def create_random_batch(self, num_figures, seed=None):
+        _require_numpy()
+        if num_figures <= 0:
+            raise ValueError('The number of figures must be positive!')
 
+        generator = np.random.default_rng(seed)
+        types = list(FigureRegistry.types())
+        codes = generator.integers(0, len(types), size=num_figures, dtype=np.uint8)
+        counts = np.bincount(codes, minlength=len(types))
+
+        columns = []
+        for entry, count in zip(types, counts.tolist()):
+            block = entry.cls.random_columns(generator, count)
+            valid, _ = entry.cls.validate_many(*block) if count else (np.ones(0, dtype=bool), None)
+            if not valid.all():
+                raise ValueError(f"Could not create figure: {entry.cls.__name__} with parameters {[column[~valid][0] for column in block]}")
+            columns.append(block)
+        return FigureBatch(types, codes, columns)
+
+    # Sides are drawn in hundredths between 1.00 and 100.00. a and b are uniform and c is
+    # uniform over the values that close the triangle, (|a - b|, a + b) clipped to that
+    # range, so every draw is valid. This is not uniform over all valid triangles like the
+    # old rejection loop: (a, b) pairs with a narrow range for c, e.g. two short sides,
+    # come up more often than they used to.
     @staticmethod
     def _create_random_triangle():
-        while True:
-            a = round(random.uniform(1, 100), 2)
-            b = round(random.uniform(1, 100), 2)
-            c = round(random.uniform(1, 100), 2)
-            if a + b > c and a + c > b and b + c > a:
-                return Triangle(a, b, c)
+        low, high = (round(limit * 100) for limit in FigureRegistry.of(Triangle).ranges[0])
+        a = random.randint(low, high)
+        b = random.randint(low, high)
+        c = random.randint(max(low, abs(a - b) + 1), min(high, a + b - 1))
+        return Triangle(a / 100, b / 100, c / 100)
+
+class Quarantine:
+    def __init__(self, stream=None, max_error_rate=None, min_lines=1000):
+        if max_error_rate is not None and not 0 <= max_error_rate <= 1:
+            raise ValueError('The error rate limit must be between 0 and 1!')
+        self.stream = stream
+        self.max_error_rate = max_error_rate
+        self.min_lines = min_lines
+        self.rejected = 0
+        self.lines = 0
+        self.by_error = Counter()
+
+    def record(self, line_number, text, error):
+        self.rejected += 1
+        self.lines = line_number
+        self.by_error[type(error).__name__] += 1
+        if self.stream is not None:
+            self.stream.write(json.dumps({'line': line_number, 'text': text, 'error': type(error).__name__,
+                                          'message': str(error)}) + '\n')
+        # Checked early only once enough lines were read for the rate to mean something;
+        # check() applies the limit to the whole input at the end.
+        if line_number >= self.min_lines:
+            self._check_rate()
+
+    def check(self, lines):
+        self.lines = max(self.lines, lines)
+        self._check_rate()
+
+    def _check_rate(self):
+        if self.max_error_rate is not None and self.lines and self.rejected / self.lines > self.max_error_rate:
+            raise OverflowError(f'The error rate of {self.rejected / self.lines:.2%} exceeded the maximum of '
+                                f'{self.max_error_rate:.2%}')
+
+    def summary(self):
+        return {'lines': self.lines, 'rejected': self.rejected,
+                'error_rate': self.rejected / self.lines if self.lines else 0.0, 'by_error': dict(self.by_error)}
+
+    def report(self):
+        summary = self.summary()
+        errors = ', '.join(f'{name}: {count}' for name, count in self.by_error.most_common())
+        return (f'Rejected {summary["rejected"]} of {summary["lines"]} lines ({summary["error_rate"]:.2%})'
+                + (f' - {errors}' if errors else ''))
+
+
+class PipeLineReader:
+    # Reads lines straight from a file descriptor instead of through sys.stdin's buffers, so
+    # that it knows when the next line would block and a partial chunk can go out first.
+    def __init__(self, fd, read_size=1 << 16):
+        self.fd = fd
+        self.read_size = read_size
+        self._lines = []
+        self._index = 0
+        self._rest = b''
+        self._eof = False
+
+    def readline(self):
+        while self._index == len(self._lines):
+            if self._eof:
+                return b''
+            self._fill()
+        line = self._lines[self._index]
+        self._index += 1
+        return line
+
+    def _fill(self):
+        data = os.read(self.fd, self.read_size)
+        self._index = 0
+        if not data:
+            self._eof = True
+            self._lines = [self._rest] if self._rest else []
+            return
+        # Line breaks match text mode; a trailing '\r' waits in case a '\n' follows it.
+        self._lines = (self._rest + data).splitlines(keepends=True)
+        self._rest = b'' if self._lines[-1].endswith(b'\n') else self._lines.pop()
+
+    def would_block(self):
+        if self._index < len(self._lines) or self._eof:
+            return False
+        try:
+            return not select.select([self.fd], [], [], 0)[0]
+        except (OSError, ValueError):
+            return False
+
 
 class StreamFigureFactory:
-    def __init__(self, stream, input_mode):
+    DEFAULT_LIMIT = object()
+    SKIPPED = object()
+
+    def __init__(self, stream, input_mode, max_figures=DEFAULT_LIMIT, pool=None, cache=None, timer=None,
+                 quarantine=None, messages=None):
         self.stream = stream
+        self.messages = messages
         self.figure_factory = FigureFactory()
+        self.pool = pool
+        self.cache = cache
+        self.timer = timer
+        self.quarantine = quarantine
         self.input_mode = input_mode
         self.figure_count = 0
-        self.max_figures = 1000 if input_mode == "stdin" else 10000
+        self.bytes_read = 0
+        self.line_number = 0
+        if max_figures is StreamFigureFactory.DEFAULT_LIMIT:
+            max_figures = 1000 if input_mode == "stdin" else 10000
+        self.max_figures = max_figures
         self.first_line_processed = False
 
     def create_figure(self):
-        if self.figure_count >= self.max_figures:
+        while True:
+            self._check_limit()
+            if self.timer is None:
+                figure = self._figure_from_line(self.stream.readline())
+            else:
+                start = self.timer.clock()
+                line = self.stream.readline()
+                self.timer.add('read', self.timer.clock() - start)
+                figure = self._figure_from_line(line)
+            if figure is not self.SKIPPED:
+                return figure
+
+    def _check_limit(self):
+        if self.max_figures is not None and self.figure_count >= self.max_figures:
             raise OverflowError(f'The number of figures exceeded the maximum of {self.max_figures}')
 
-        line = self.stream.readline().strip()
+    def _figure_from_line(self, line):
+        self.bytes_read += len(line)
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if line:
+            self.line_number += 1
+        raw = line
+        line = line.strip()
 
         if not self.first_line_processed:
             self.first_line_processed = True
@@ -128,15 +706,1396 @@ class StreamFigureFactory:
             if self.input_mode == "file":
                 raise ValueError("Invalid input in file: there should not be 'exit' in file!")
             elif self.input_mode == "stdin":
-                print("Exiting program.")
+                print("Exiting program.", file=self.messages or sys.stdout)
                 return None
 
         self.figure_count += 1
 
-        return self.figure_factory.create_figure(line)
+        if self.quarantine is None:
+            return self.figure_factory.create_figure(line, pool=self.pool, cache=self.cache, timer=self.timer)
+        try:
+            return self.figure_factory.create_figure(line, pool=self.pool, cache=self.cache, timer=self.timer)
+        except (ValueError, OverflowError) as e:
+            self.figure_count -= 1
+            self.quarantine.record(self.line_number, raw.rstrip('\r\n'), e)
+            return self.SKIPPED
+
+    def iter_figures(self, chunk_size=None, as_batch=False, max_bytes=None):
+        if chunk_size is None and max_bytes is None:
+            while True:
+                figure = self.create_figure()
+                if figure is None:
+                    return
+                yield figure
+
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError('The chunk size must be positive!')
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError('The memory budget must be positive!')
+
+        # Streams that can tell when a read would block get their partial chunk out before it.
+        would_block = getattr(self.stream, 'would_block', None)
+        chunk = []
+        chunk_start = self.bytes_read
+        while True:
+            if chunk and would_block is not None and would_block():
+                yield FigureBatch.from_figures(chunk) if as_batch else chunk
+                chunk = []
+                chunk_start = self.bytes_read
+            try:
+                figure = self.create_figure()
+            except (ValueError, OverflowError):
+                if chunk:
+                    yield FigureBatch.from_figures(chunk) if as_batch else chunk
+                raise
+            if figure is None:
+                break
+            chunk.append(figure)
+            if len(chunk) == chunk_size or (max_bytes is not None and self.bytes_read - chunk_start >= max_bytes):
+                yield FigureBatch.from_figures(chunk) if as_batch else chunk
+                chunk = []
+                chunk_start = self.bytes_read
+
+        if chunk:
+            yield FigureBatch.from_figures(chunk) if as_batch else chunk
+
+    def __iter__(self):
+        return self.iter_figures()
+
+
+class AsyncStreamFigureFactory(StreamFigureFactory):
+    def __init__(self, reader, input_mode="stdin", max_figures=StreamFigureFactory.DEFAULT_LIMIT, pool=None, cache=None,
+                 timer=None, quarantine=None, messages=None):
+        super().__init__(reader, input_mode, max_figures, pool, cache, timer, quarantine, messages)
+
+    @classmethod
+    async def open_pipe(cls, pipe=None, input_mode="stdin", **kwargs):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe or sys.stdin)
+        return cls(reader, input_mode, **kwargs)
+
+    async def create_figure(self):
+        while True:
+            self._check_limit()
+            if self.timer is None:
+                figure = self._figure_from_line(await self.stream.readline())
+            else:
+                start = self.timer.clock()
+                line = await self.stream.readline()
+                self.timer.add('read', self.timer.clock() - start)
+                figure = self._figure_from_line(line)
+            if figure is not self.SKIPPED:
+                return figure
+
+    async def iter_figures(self, chunk_size=None, as_batch=False, max_bytes=None):
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError('The chunk size must be positive!')
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError('The memory budget must be positive!')
+        chunked = chunk_size is not None or max_bytes is not None
+
+        chunk = []
+        chunk_start = self.bytes_read
+        while True:
+            try:
+                figure = await self.create_figure()
+            except (ValueError, OverflowError):
+                if chunk:
+                    yield FigureBatch.from_figures(chunk) if as_batch else chunk
+                raise
+            if figure is None:
+                break
+            if not chunked:
+                yield figure
+                continue
+            chunk.append(figure)
+            if len(chunk) == chunk_size or (max_bytes is not None and self.bytes_read - chunk_start >= max_bytes):
+                yield FigureBatch.from_figures(chunk) if as_batch else chunk
+                chunk = []
+                chunk_start = self.bytes_read
+
+        if chunk:
+            yield FigureBatch.from_figures(chunk) if as_batch else chunk
+
+    def __aiter__(self):
+        return self.iter_figures()
+
+    def __iter__(self):
+        raise TypeError('AsyncStreamFigureFactory must be consumed with "async for"!')
+
+
+class FigureBatch:
+    def __init__(self, types, codes, columns):
+        _require_numpy()
+        self.types = tuple(types)
+        self.codes = np.ascontiguousarray(codes, dtype=np.uint8)
+        self.columns = [
+            tuple(np.ascontiguousarray(column, dtype=np.float64) for column in block)
+            for block in columns
+        ]
+        self._rows = None
+
+        if len(self.columns) != len(self.types):
+            raise ValueError('Every figure type in a batch needs its own column set!')
+        for code, (entry, block) in enumerate(zip(self.types, self.columns)):
+            if len(block) != entry.arity:
+                raise ValueError(f'Incorrect number of columns for {entry.name}: {len(block)}')
+            expected = int(np.count_nonzero(self.codes == code))
+            if any(len(column) != expected for column in block):
+                raise ValueError(f'Column lengths for {entry.name} do not match its type codes!')
+
+    @classmethod
+    def from_figures(cls, figures):
+        _require_numpy()
+        types, index, values, codes = [], {}, [], []
+        for figure in figures:
+            code = index.get(type(figure))
+            if code is None:
+                entry = FigureRegistry.of(type(figure))
+                if entry is None:
+                    raise ValueError(f'Unknown or invalid figure type: {type(figure).__name__}')
+                code = index[type(figure)] = len(types)
+                types.append(entry)
+                values.append([])
+            codes.append(code)
+            values[code].append(figure.dimensions)
+
+        columns = []
+        for entry, rows in zip(types, values):
+            matrix = np.array(rows, dtype=np.float64).reshape(len(rows), entry.arity)
+            columns.append(tuple(matrix[:, i] for i in range(entry.arity)))
+        return cls(types, np.array(codes, dtype=np.uint8), columns)
+
+    @classmethod
+    def from_columns(cls, figure_type, *columns):
+        _require_numpy()
+        entry = FigureRegistry.get(figure_type)
+        if entry is None:
+            raise ValueError(f'Unknown or invalid figure type: {figure_type.capitalize()}')
+        if len(columns) != entry.arity:
+            raise ValueError(f'Incorrect parameters for {figure_type.capitalize()}: {len(columns)} columns')
+
+        cls._check_columns(entry, columns)
+
+        columns = tuple(np.asarray(column, dtype=np.float64) for column in columns)
+        count = len(columns[0]) if columns else 0
+        return cls((entry,), np.zeros(count, dtype=np.uint8), [columns])
+
+    @classmethod
+    def concat(cls, batches):
+        _require_numpy()
+        batches = list(batches)
+        types, index = [], {}
+        for batch in batches:
+            for entry in batch.types:
+                if entry.name not in index:
+                    index[entry.name] = len(types)
+                    types.append(entry)
+
+        codes = [
+            np.array([index[entry.name] for entry in batch.types], dtype=np.uint8)[batch.codes]
+            for batch in batches if len(batch)
+        ]
+        columns = []
+        for entry in types:
+            blocks = [
+                block for batch in batches
+                for other, block in zip(batch.types, batch.columns) if other.name == entry.name
+            ]
+            columns.append(tuple(np.concatenate([block[i] for block in blocks]) for i in range(entry.arity)))
+        codes = np.concatenate(codes) if codes else np.empty(0, dtype=np.uint8)
+        return cls(types, codes, columns)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __repr__(self):
+        return f'FigureBatch({len(self)} figures)'
+
+    @staticmethod
+    def _check_columns(entry, columns):
+        valid, codes = entry.cls.validate_many(*columns)
+        if not valid.all():
+            row = int(np.argmax(~valid))
+            if entry.validator is not None:
+                entry.validator(*(np.asarray(column)[row].item() for column in columns))
+            raise ValueError(f'Invalid {entry.name} at row {row}!')
+
+    def to_bytes(self, compress=False):
+        table = bytearray()
+        for code, entry in enumerate(self.types):
+            name = entry.name.encode('utf-8')
+            rows = int(np.count_nonzero(self.codes == code))
+            table += _BINARY_TYPE.pack(len(name), entry.arity, rows) + name
+            table += bytes(-len(table) % 8)
+
+        payload = bytearray(self.codes.tobytes())
+        payload += bytes(-len(payload) % 8)
+        for block in self.columns:
+            for column in block:
+                payload += column.astype('<f8', copy=False).tobytes()
+        if compress:
+            payload = zlib.compress(payload)
+
+        flags = BINARY_ZLIB if compress else 0
+        header = _BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags, len(self), len(self.types))
+        return header + bytes(table) + bytes(payload)
+
+    def save(self, file_path, compress=False):
+        with open(file_path, 'wb') as file:
+            file.write(self.to_bytes(compress))
+
+    @classmethod
+    def from_bytes(cls, data, validate=True):
+        _require_numpy()
+        return cls._from_buffer(np.frombuffer(data, dtype=np.uint8), validate)
+
+    @classmethod
+    def load(cls, file_path, validate=True):
+        _require_numpy()
+        if os.path.getsize(file_path) < _BINARY_HEADER.size:
+            raise ValueError('Not a figure binary file!')
+        return cls._from_buffer(np.memmap(file_path, dtype=np.uint8, mode='r'), validate)
+
+    @classmethod
+    def _from_buffer(cls, buffer, validate):
+        if len(buffer) < _BINARY_HEADER.size:
+            raise ValueError('Not a figure binary file!')
+        magic, version, flags, count, type_count = _BINARY_HEADER.unpack_from(buffer, 0)
+        if magic != BINARY_MAGIC:
+            raise ValueError('Not a figure binary file!')
+        if version != BINARY_VERSION:
+            raise ValueError(f'Unsupported figure binary version: {version}')
+
+        offset = _BINARY_HEADER.size
+        types, layout = [], []
+        for _ in range(type_count):
+            if offset + _BINARY_TYPE.size > len(buffer):
+                raise ValueError('Figure binary file is truncated!')
+            name_length, arity, rows = _BINARY_TYPE.unpack_from(buffer, offset)
+            offset += _BINARY_TYPE.size
+            if offset + name_length > len(buffer):
+                raise ValueError('Figure binary file is truncated!')
+            name = bytes(buffer[offset:offset + name_length]).decode('utf-8')
+            offset += name_length + (-(offset + name_length) % 8)
+            entry = FigureRegistry.get(name)
+            if entry is None:
+                raise ValueError(f'Unknown or invalid figure type: {name.capitalize()}')
+            if entry.arity != arity:
+                raise ValueError(f'Incorrect parameters for {name.capitalize()}: {arity} columns')
+            types.append(entry)
+            layout.append(rows)
+
+        # Uncompressed payloads are used in place: codes and columns are views into the
+        # (memory-mapped) buffer, which is why every block starts on an 8-byte boundary.
+        if flags & BINARY_ZLIB:
+            try:
+                payload, offset = np.frombuffer(zlib.decompress(buffer[offset:]), dtype=np.uint8), 0
+            except zlib.error as e:
+                raise ValueError('Figure binary file is truncated!') from e
+        else:
+            payload = buffer
+        codes = payload[offset:offset + count]
+        offset += count + (-count % 8)
+        columns = []
+        for entry, rows in zip(types, layout):
+            block = []
+            for _ in range(entry.arity):
+                if offset + rows * 8 > len(payload):
+                    raise ValueError('Figure binary file is truncated!')
+                block.append(np.frombuffer(payload, dtype='<f8', count=rows, offset=offset))
+                offset += rows * 8
+            columns.append(tuple(block))
+        if len(codes) != count:
+            raise ValueError('Figure binary file is truncated!')
+        if count and int(codes.max()) >= len(types):
+            raise ValueError('Figure binary file has an invalid type code!')
+
+        if validate:
+            for entry, block in zip(types, columns):
+                cls._check_columns(entry, block)
+        return cls(types, codes, columns)
+
+    def _row_index(self):
+        if self._rows is None:
+            rows = np.empty(len(self.codes), dtype=np.int64)
+            for code in range(len(self.types)):
+                mask = self.codes == code
+                rows[mask] = np.arange(np.count_nonzero(mask))
+            self._rows = rows
+        return self._rows
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Figure batch index out of range!')
+
+        code = self.codes[index]
+        row = self._row_index()[index]
+        return self.types[code].cls(*[column[row].item() for column in self.columns[code]])
+
+    def __iter__(self):
+        positions = [0] * len(self.types)
+        for code in self.codes.tolist():
+            row = positions[code]
+            positions[code] += 1
+            yield self.types[code].cls(*[column[row].item() for column in self.columns[code]])
+
+    def get_perimeter(self):
+        perimeters = np.empty(len(self), dtype=np.float64)
+        for code, (entry, block) in enumerate(zip(self.types, self.columns)):
+            mask = self.codes == code
+            if mask.any():
+                perimeters[mask] = entry.cls.perimeter_many(*block)
+        return perimeters
+
+    def format_lines(self, prefix=''):
+        lines = np.empty(len(self), dtype=object)
+        for code, (entry, block) in enumerate(zip(self.types, self.columns)):
+            mask = self.codes == code
+            if mask.any():
+                lines[mask] = [prefix + line for line in entry.cls.format_many(*block)] if prefix else entry.cls.format_many(*block)
+        return lines.tolist()
+
+    def get_area(self):
+        areas = np.empty(len(self), dtype=np.float64)
+        for code, (entry, block) in enumerate(zip(self.types, self.columns)):
+            mask = self.codes == code
+            if mask.any():
+                areas[mask] = entry.cls.area_many(*block)
+        return areas
+
+
+def _words_before(buffer, ends):
+    # Little-endian words of the eight bytes in front of each (sorted) end, so the
+    # byte just before the end is always the top one, even near the buffer start.
+    view = np.ndarray((len(buffer) - 7,), dtype='<u8', buffer=buffer, strides=(1,))
+    short = np.searchsorted(ends, 8)
+    words = view[ends - 8] if not short else view[np.maximum(ends, 8) - 8]
+    words[:short] <<= (8 * (8 - ends[:short])).astype(np.uint64)
+    return words
+
+
+def _name_matches(words, name):
+    # Letters are compared with their case bit forced on, any other byte exactly.
+    shift = 8 * (8 - len(name))
+    fold = bytes(0x20 if ord('a') <= c | 0x20 <= ord('z') else 0 for c in name)
+    mask = np.uint64((1 << 64) - (1 << shift))
+    fold = np.uint64(int.from_bytes(fold, 'little') << shift)
+    return ((words | fold) & mask) == np.uint64(int.from_bytes(name, 'little') << shift)
+
+
+def _parse_short_decimals(buffer, ends, lengths):
+    # Every token of up to eight bytes is one word: the bytes in front of it become
+    # '0', the decimal point is squeezed out and the eight digits are combined
+    # pairwise. The mantissa stays below 10**8, so one division by the power of
+    # ten gives the same correctly rounded value as float() on the token.
+    ones = 0x0101010101010101
+    full = (1 << 64) - 1
+    zeros = np.uint64(ord('0') * ones)
+    keep = np.array([0] + [full << 8 * (8 - length) & full for length in range(1, 9)], dtype=np.uint64)
+    words = _words_before(buffer, ends) & keep[lengths] | (zeros & ~keep)[lengths]
+
+    low = np.uint64(0x7F * ones)
+    points = words ^ np.uint64(ord('.') * ones)
+    points = ~(((points & low) + low) | points | low)
+    # The lowest point is a power of two; its exponent picks the byte it sits in,
+    # with 0 left for tokens that have no point at all.
+    position = np.frexp((points & (~points + np.uint64(1))).astype(np.float64))[1] >> 3
+    if ((position == 8) & (lengths == 1)).any():
+        return None
+    above = np.array([full] + [full ^ ((1 << 8 * byte) - 1) for byte in range(1, 9)], dtype=np.uint64)
+    below = np.array([0] + [(1 << 8 * byte) - 1 for byte in range(8)], dtype=np.uint64)
+    filler = np.array([0] + [ord('0')] * 8, dtype=np.uint64)
+    words = (words & above[position]) | ((words & below[position]) << np.uint64(8)) | filler[position]
+
+    high = np.uint64(0xF0 * ones)
+    if not (((words & high) == zeros) & (((words + np.uint64(6 * ones)) & high) == zeros)).all():
+        return None
+    words -= zeros
+    words = (words * np.uint64(10) + (words >> np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    words = (words * np.uint64(100) + (words >> np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    words = (words * np.uint64(10000) + (words >> np.uint64(32))) & np.uint64(0xFFFFFFFF)
+    return words / np.array([1.0] + [10.0 ** (7 - byte) for byte in range(8)])[position]
+
+
+def _parse_long_decimals(buffer, starts, lengths):
+    if lengths.max() > 16:
+        return None
+
+    points = np.flatnonzero(buffer == ord('.'))
+    owners = np.searchsorted(starts, points, side='right') - 1
+    inside = (owners >= 0) & (points < starts[owners] + lengths[owners])
+    points, owners = points[inside], owners[inside]
+    if (np.diff(owners) == 0).any():
+        return None
+    point = np.full(len(starts), -1, dtype=np.int64)
+    point[owners] = points - starts[owners]
+
+    # Tokens are grouped by length and decimal point position, so every group is a
+    # fixed digit layout whose mantissa is a single dot product with powers of ten.
+    # Below 2**53 both the mantissa and the power of ten are exact doubles, and one
+    # division then gives the same correctly rounded value as float() on the token.
+    values = np.empty(len(starts), dtype=np.float64)
+    keys = lengths * 17 + point + 1
+    powers = 10 ** np.arange(16, dtype=np.int64)
+    for key in np.flatnonzero(np.bincount(keys)).tolist():
+        length, position = divmod(key, 17)
+        position -= 1
+        rows = np.flatnonzero(keys == key)
+        columns = np.arange(length)
+        if position >= 0:
+            columns = np.delete(columns, position)
+        if not len(columns) or len(columns) > 15:
+            return None
+        digits = buffer[starts[rows, None] + columns] - ord('0')
+        if digits.max() > 9:
+            return None
+        mantissa = digits.astype(np.int64) @ powers[len(columns) - 1::-1]
+        values[rows] = mantissa / powers[length - position - 1 if position >= 0 else 0]
+    return values
+
+
+def _parse_decimals(buffer, ends, lengths):
+    short = lengths <= 8
+    if short.all():
+        return _parse_short_decimals(buffer, ends, lengths)
+
+    values = np.empty(len(ends), dtype=np.float64)
+    long = ~short
+    short_values = _parse_short_decimals(buffer, ends[short], lengths[short])
+    long_values = _parse_long_decimals(buffer, ends[long] - lengths[long], lengths[long])
+    if short_values is None or long_values is None:
+        return None
+    values[short] = short_values
+    values[long] = long_values
+    return values
+
+
+def _parse_block_fast(data, types):
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if len(buffer) < 8:
+        return None
+
+    # Spaces and newlines must be the only bytes up to ' ', so the separators and
+    # the control character check come out of the same pass over the block.
+    separators = np.flatnonzero(buffer <= ord(' '))
+    kinds = buffer[separators]
+    newlines = kinds == ord('\n')
+    if not (newlines | (kinds == ord(' '))).all():
+        return None
+    starts = np.empty_like(separators)
+    starts[0] = 0
+    starts[1:] = separators[:-1] + 1
+    lengths = separators - starts
+    if not lengths.all():
+        return None
+
+    line_last = np.flatnonzero(newlines)
+    line_first = np.empty_like(line_last)
+    line_first[0] = 0
+    line_first[1:] = line_last[:-1] + 1
+    counts = line_last - line_first + 1
+
+    name_ends = separators[line_first]
+    name_lengths = lengths[line_first]
+    tails = _words_before(buffer, name_ends)
+    codes = np.full(len(line_first), len(types), dtype=np.uint8)
+    for code, entry in enumerate(types):
+        name = entry.name.encode()
+        if len(name) > 16:
+            continue
+        rows = np.flatnonzero((name_lengths == len(name)) & (counts == entry.arity + 1))
+        matched = _name_matches(tails[rows], name[-8:])
+        if len(name) > 8:
+            matched &= _name_matches(_words_before(buffer, name_ends[rows] - len(name) + 8), name[:8])
+        codes[rows[matched]] = code
+    if (codes == len(types)).any():
+        return None
+
+    is_number = np.empty(len(starts), dtype=bool)
+    is_number[0] = False
+    is_number[1:] = ~newlines[:-1]
+    number_lengths = lengths[is_number]
+    values = np.empty(0)
+    if len(number_lengths):
+        values = _parse_decimals(buffer, separators[is_number], number_lengths)
+        if values is None:
+            return None
+
+    offsets = line_first - np.arange(len(line_first))
+    columns = []
+    for code, entry in enumerate(types):
+        rows = offsets[codes == code]
+        columns.append(tuple(values[rows + i] for i in range(entry.arity)))
+    return codes, columns
+
 
+def _line_error(error, number):
+    # Decode errors cannot be rebuilt from a message alone, so they are reported as ValueError.
+    located = (ValueError if isinstance(error, UnicodeError) else type(error))(f'Line {number}: {error}')
+    located.line_number = number
+    located.reason = str(error)
+    return located
+
+
+def _parse_block_slow(data, types, first_line, at_start):
+    index = {entry.cls: code for code, entry in enumerate(types)}
+    codes, rows = [], [[] for _ in types]
+    stopped = False
+    for number, line in enumerate(data.split(b'\n')[:-1], first_line):
+        try:
+            line = line.decode().strip()
+        except UnicodeDecodeError as e:
+            raise _line_error(e, number) from e
+        if not line:
+            if at_start and number == first_line:
+                raise ValueError("No input provided in file!")
+            stopped = True
+            break
+        if line.lower() == 'exit':
+            raise _line_error(ValueError("Invalid input in file: there should not be 'exit' in file!"), number)
+        try:
+            figure = FigureFactory.create_figure(line)
+        except (ValueError, OverflowError) as e:
+            raise _line_error(e, number) from e
+        code = index[type(figure)]
+        codes.append(code)
+        rows[code].append(figure.dimensions)
+
+    columns = []
+    for entry, values in zip(types, rows):
+        matrix = np.array(values, dtype=np.float64).reshape(len(values), entry.arity)
+        columns.append(tuple(matrix[:, i] for i in range(entry.arity)))
+    return np.array(codes, dtype=np.uint8), columns, stopped
+
+
+def _parse_block(data, types, first_line, at_start):
+    if not data.endswith(b'\n'):
+        data += b'\n'
+
+    parsed = _parse_block_fast(data, types)
+    if parsed is not None:
+        codes, columns = parsed
+        present = np.flatnonzero(np.bincount(codes, minlength=len(types))).tolist()
+        if all(types[code].cls.validate_many(*columns[code])[0].all() for code in present):
+            stopped = False
+        else:
+            parsed = None
+    if parsed is None:
+        codes, columns, stopped = _parse_block_slow(data, types, first_line, at_start)
+        present = np.flatnonzero(np.bincount(codes, minlength=len(types))).tolist()
+
+    remap = np.zeros(len(types), dtype=np.uint8)
+    remap[present] = np.arange(len(present))
+    return [types[code] for code in present], remap[codes], [columns[code] for code in present], stopped
+
+
+def _parse_shard(file_path, start, end, names):
+    types = [FigureRegistry.get(name) for name in names]
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = mapped[start:end]
+
+    try:
+        present, codes, columns, stopped = _parse_block(data, types, 1, start == 0)
+    except (ValueError, OverflowError) as e:
+        return 0, None, e
+    return len(codes), ([entry.name for entry in present], codes, columns, stopped), None
+
+
+class MappedFigureFactory:
+    def __init__(self, file_path, block_size=1 << 20):
+        if block_size <= 0:
+            raise ValueError('The block size must be positive!')
+        self.file_path = file_path
+        self.block_size = block_size
+
+    def _ranges(self, mapped, size):
+        start = 0
+        while start < size:
+            end = mapped.find(b'\n', min(start + self.block_size, size) - 1)
+            end = size if end == -1 else end + 1
+            yield start, end
+            start = end
+
+    def iter_batches(self, workers=None):
+        _require_numpy()
+        if workers is not None:
+            yield from self._iter_batches_parallel(workers)
+            return
+
+        types = list(FigureRegistry.types())
+        with open(self.file_path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                raise ValueError("No input provided in file!")
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                line_number = 1
+                for start, end in self._ranges(mapped, size):
+                    data = mapped[start:end]
+                    present, codes, columns, stopped = _parse_block(data, types, line_number, start == 0)
+                    if len(codes):
+                        yield FigureBatch(present, codes, columns)
+                    if stopped:
+                        return
+                    line_number += len(codes)
+
+    def _iter_batches_parallel(self, workers):
+        if workers <= 0:
+            raise ValueError('The number of workers must be positive!')
+
+        names = FigureRegistry.names()
+        with open(self.file_path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                raise ValueError("No input provided in file!")
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                ranges = list(self._ranges(mapped, size))
+
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque()
+            shards = iter(ranges)
+            line_offset = 0
+            try:
+                while True:
+                    while len(pending) < 2 * workers:
+                        shard = next(shards, None)
+                        if shard is None:
+                            break
+                        pending.append(pool.submit(_parse_shard, self.file_path, *shard, names))
+                    if not pending:
+                        return
+
+                    lines, parsed, error = pending.popleft().result()
+                    if error is not None:
+                        # Located errors carry the shard's line number; rebase it on the file.
+                        if getattr(error, 'line_number', None) is None:
+                            raise error
+                        raise _line_error(type(error)(error.reason), line_offset + error.line_number)
+
+                    present, codes, columns, stopped = parsed
+                    if len(codes):
+                        yield FigureBatch([FigureRegistry.get(name) for name in present], codes, columns)
+                    if stopped:
+                        return
+                    line_offset += lines
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def create_batch(self, workers=None):
+        return FigureBatch.concat(self.iter_batches(workers))
+
+
+class TDigest:
+    def __init__(self, compression=200):
+        if compression <= 0:
+            raise ValueError('The compression must be positive!')
+        self.compression = compression
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self._means = []
+        self._weights = []
+        self._buffer = []
+
+    def _scale(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def add(self, value, weight=1):
+        self._buffer.append((value, weight))
+        self.count += weight
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        if len(self._buffer) >= 10 * self.compression:
+            self._compress()
+
+    def add_many(self, values):
+        _require_numpy()
+        values = np.sort(np.asarray(values, dtype=np.float64))
+        if not len(values):
+            return
+        self.count += len(values)
+        self.minimum = min(self.minimum, float(values[0]))
+        self.maximum = max(self.maximum, float(values[-1]))
+
+        # Pre-reduce the batch with the same scale function so the merge below
+        # only walks a few hundred centroids, however large the batch is.
+        q = (np.arange(len(values)) + 0.5) / len(values)
+        buckets = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)).astype(np.int64)
+        buckets -= buckets[0]
+        weights = np.bincount(buckets)
+        sums = np.bincount(buckets, weights=values)
+        used = weights > 0
+        self._buffer.extend(zip((sums[used] / weights[used]).tolist(), weights[used].tolist()))
+        self._compress()
+
+    def merge(self, other):
+        self._compress()
+        other._compress()
+        self._buffer.extend(zip(other._means, other._weights))
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._compress()
+        return self
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self._means, self._weights)) + self._buffer)
+        total = sum(weight for _, weight in points)
+        means, weights = [], []
+        cumulative, start = 0, None
+        for mean, weight in points:
+            if start is not None and self._scale((cumulative + weight) / total) - start <= 1:
+                merged = weights[-1] + weight
+                means[-1] += (mean - means[-1]) * weight / merged
+                weights[-1] = merged
+            else:
+                means.append(mean)
+                weights.append(weight)
+                start = self._scale(cumulative / total)
+            cumulative += weight
+        self._means, self._weights, self._buffer = means, weights, []
+
+    def centroids(self):
+        self._compress()
+        return list(zip(self._means, self._weights))
+
+    def quantile(self, q):
+        if not 0 <= q <= 1:
+            raise ValueError('The quantile must be between 0 and 1!')
+        if not self.count:
+            raise ValueError('The digest is empty!')
+        self._compress()
+
+        target = q * self.count
+        previous_mean, previous_center = self.minimum, 0.0
+        cumulative = 0
+        for mean, weight in zip(self._means, self._weights):
+            center = cumulative + weight / 2
+            if target < center:
+                break
+            previous_mean, previous_center = mean, center
+            cumulative += weight
+        else:
+            mean, center = self.maximum, self.count
+
+        if center == previous_center:
+            return mean
+        return previous_mean + (mean - previous_mean) * (target - previous_center) / (center - previous_center)
+
+
+class PerimeterStats:
+    def __init__(self, compression=200):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.digest = TDigest(compression)
+
+    def add(self, perimeter):
+        self.count += 1
+        self.total += perimeter
+        self.minimum = min(self.minimum, perimeter)
+        self.maximum = max(self.maximum, perimeter)
+        delta = perimeter - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (perimeter - self.mean)
+        self.digest.add(perimeter)
+
+    def add_many(self, perimeters):
+        _require_numpy()
+        perimeters = np.asarray(perimeters, dtype=np.float64)
+        if not len(perimeters):
+            return
+        self._combine(len(perimeters), float(perimeters.sum()), float(perimeters.min()), float(perimeters.max()),
+                      float(perimeters.mean()), float(((perimeters - perimeters.mean()) ** 2).sum()))
+        self.digest.add_many(perimeters)
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.total, other.minimum, other.maximum, other.mean, other._m2)
+            self.digest.merge(other.digest)
+        return self
+
+    def _combine(self, count, total, minimum, maximum, mean, m2):
+        combined = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / combined
+        self._m2 += m2 + delta * delta * self.count * count / combined
+        self.count = combined
+        self.total += total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def sample_variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def percentile(self, percent):
+        return self.digest.quantile(percent / 100)
+
+    def summary(self, percentiles=(50, 90, 99)):
+        summary = {'count': self.count, 'sum': self.total, 'min': self.minimum if self.count else None,
+                   'max': self.maximum if self.count else None, 'mean': self.mean, 'variance': self.variance}
+        if self.count:
+            summary.update({f'p{percent}': self.percentile(percent) for percent in percentiles})
+        return summary
+
+
+class PerimeterAggregator:
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.overall = PerimeterStats(compression)
+        self.by_type = {}
+
+    def _stats(self, name):
+        stats = self.by_type.get(name)
+        if stats is None:
+            stats = self.by_type[name] = PerimeterStats(self.compression)
+        return stats
+
+    def add(self, figure):
+        perimeter = figure.get_perimeter()
+        self._stats(FigureRegistry.of(type(figure)).name).add(perimeter)
+        self.overall.add(perimeter)
+
+    def add_batch(self, batch):
+        perimeters = batch.get_perimeter()
+        for code, entry in enumerate(batch.types):
+            mask = batch.codes == code
+            if mask.any():
+                self._stats(entry.name).add_many(perimeters[mask])
+        self.overall.add_many(perimeters)
+
+    def consume(self, figures):
+        for item in figures:
+            if isinstance(item, FigureBatch):
+                self.add_batch(item)
+            elif isinstance(item, list):
+                for figure in item:
+                    self.add(figure)
+            else:
+                self.add(item)
+        return self
+
+    def merge(self, other):
+        self.overall.merge(other.overall)
+        for name, stats in other.by_type.items():
+            self._stats(name).merge(stats)
+        return self
+
+    def summary(self, percentiles=(50, 90, 99)):
+        return {
+            'overall': self.overall.summary(percentiles),
+            'by_type': {name: stats.summary(percentiles) for name, stats in self.by_type.items()},
+        }
+
+
+class _SortedPerimeters:
+    __slots__ = ('keys', 'figures')
+
+    def __init__(self):
+        self.keys = []
+        self.figures = []
+
+    def insert(self, perimeter, figure):
+        position = bisect.bisect_right(self.keys, perimeter)
+        self.keys.insert(position, perimeter)
+        self.figures.insert(position, figure)
+
+    def extend(self, perimeters, figures):
+        if len(perimeters) * 8 < len(self.keys):
+            for perimeter, figure in zip(perimeters, figures):
+                self.insert(perimeter, figure)
+            return
+        # Timsort merges the existing sorted run with the new one in near-linear time.
+        pairs = sorted(zip(self.keys + list(perimeters), self.figures + list(figures)), key=itemgetter(0))
+        self.keys = [pair[0] for pair in pairs]
+        self.figures = [pair[1] for pair in pairs]
+
+    def bounds(self, low, high):
+        start = 0 if low is None else bisect.bisect_left(self.keys, low)
+        end = len(self.keys) if high is None else bisect.bisect_right(self.keys, high)
+        return start, max(start, end)
+
+
+class PerimeterIndex:
+    def __init__(self, figures=()):
+        self._all = _SortedPerimeters()
+        self._by_type = {}
+        self.consume([figures] if isinstance(figures, FigureBatch) else figures)
+
+    def _run(self, figure_type):
+        if figure_type is None:
+            return self._all
+        if isinstance(figure_type, type):
+            entry = FigureRegistry.of(figure_type)
+            if entry is None:
+                return _SortedPerimeters()
+            figure_type = entry.name
+        return self._by_type.get(figure_type.lower()) or _SortedPerimeters()
+
+    def _type_run(self, name):
+        run = self._by_type.get(name)
+        if run is None:
+            run = self._by_type[name] = _SortedPerimeters()
+        return run
+
+    def add(self, figure):
+        perimeter = figure.get_perimeter()
+        self._all.insert(perimeter, figure)
+        self._type_run(FigureRegistry.of(type(figure)).name).insert(perimeter, figure)
+
+    def extend(self, figures):
+        groups = {}
+        for figure in figures:
+            perimeters, members = groups.setdefault(FigureRegistry.of(type(figure)).name, ([], []))
+            perimeters.append(figure.get_perimeter())
+            members.append(figure)
+        self._extend_groups(groups)
+
+    def add_batch(self, batch):
+        perimeters = batch.get_perimeter()
+        groups = {}
+        for code, entry in enumerate(batch.types):
+            rows = np.flatnonzero(batch.codes == code)
+            if len(rows):
+                groups[entry.name] = (perimeters[rows].tolist(), [batch[row] for row in rows.tolist()])
+        self._extend_groups(groups)
+
+    def _extend_groups(self, groups):
+        perimeters, figures = [], []
+        for name, (group_perimeters, group_figures) in groups.items():
+            self._type_run(name).extend(group_perimeters, group_figures)
+            perimeters.extend(group_perimeters)
+            figures.extend(group_figures)
+        self._all.extend(perimeters, figures)
+
+    def consume(self, figures):
+        pending = []
+        for item in figures:
+            if isinstance(item, FigureBatch):
+                self.add_batch(item)
+            elif isinstance(item, list):
+                pending.extend(item)
+            else:
+                pending.append(item)
+        self.extend(pending)
+        return self
+
+    def __len__(self):
+        return len(self._all.keys)
+
+    def __iter__(self):
+        return iter(self._all.figures)
+
+    def range(self, low=None, high=None, figure_type=None):
+        run = self._run(figure_type)
+        start, end = run.bounds(low, high)
+        return run.figures[start:end]
+
+    def count(self, low=None, high=None, figure_type=None):
+        start, end = self._run(figure_type).bounds(low, high)
+        return end - start
+
+    def top_k(self, k, figure_type=None):
+        figures = self._run(figure_type).figures
+        return figures[:-k - 1:-1] if k > 0 else []
+
+    def bottom_k(self, k, figure_type=None):
+        return self._run(figure_type).figures[:max(k, 0)]
+
+    def rank(self, perimeter, figure_type=None):
+        return bisect.bisect_left(self._run(figure_type).keys, perimeter)
+
+
+class FigureWriter:
+    def __init__(self, stream, prefix='', buffer_size=1 << 20, timer=None):
+        self.stream = stream
+        self.prefix = prefix
+        self.buffer_size = buffer_size
+        self.timer = timer
+        self.figures_written = 0
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, figure):
+        self.write_many((figure,))
+
+    def write_many(self, figures):
+        prefix = self.prefix
+        start = None if self.timer is None else self.timer.clock()
+        lines = [f'{prefix}{figure}' for figure in figures]
+        if start is not None:
+            self.timer.add('format', self.timer.clock() - start)
+        self.write_lines(lines)
+        self.figures_written += len(lines)
+
+    def write_batch(self, batch):
+        start = None if self.timer is None else self.timer.clock()
+        lines = batch.format_lines(self.prefix)
+        if start is not None:
+            self.timer.add('format', self.timer.clock() - start)
+        self.write_lines(lines)
+        self.figures_written += len(batch)
+
+    def write_chunk(self, chunk):
+        if isinstance(chunk, FigureBatch):
+            self.write_batch(chunk)
+        else:
+            self.write_many(chunk)
+
+    def write_lines(self, lines):
+        if not lines:
+            return
+        text = '\n'.join(lines) + '\n'
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            text = ''.join(self._pending)
+            self._pending = []
+            self._pending_size = 0
+            self.stream.write(text)
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
+class FigureServer:
+    MAX_LINE = 1 << 16
+
+    def __init__(self, path, cache_size=65536):
+        self.path = path
+        self.cache = ParseCache(cache_size)
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+        self._socket_id = None
+
+    def respond(self, line):
+        self.requests += 1
+        try:
+            figure = FigureFactory.create_figure(line, cache=self.cache)
+        except (ValueError, OverflowError, TypeError) as e:
+            self.errors += 1
+            return f'error\t{type(e).__name__}\t{e}'
+        return f'ok\t{figure}\t{figure.get_perimeter()}'
+
+    async def handle(self, reader, writer):
+        pending = b''
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                lines = (pending + data).split(b'\n')
+                pending = lines.pop()
+                if len(pending) > self.MAX_LINE:
+                    writer.write(f'error\tValueError\tLines cannot be longer than {self.MAX_LINE} bytes!\n'.encode())
+                    break
+                # Every line read in one go is answered with a single write, so clients can
+                # pipeline whole batches and pay for one round trip.
+                if lines:
+                    writer.write(''.join(self.respond(line.decode('utf-8', 'replace')) + '\n' for line in lines).encode())
+                    await writer.drain()
+            if pending.strip():
+                writer.write((self.respond(pending.decode('utf-8', 'replace')) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _stat(self):
+        try:
+            return os.lstat(self.path)
+        except FileNotFoundError:
+            return None
+
+    async def start(self):
+        existing = self._stat()
+        if existing is not None:
+            if not stat.S_ISSOCK(existing.st_mode):
+                raise FileExistsError(f'{self.path} exists and is not a socket!')
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self.handle, path=self.path)
+        created = self._stat()
+        self._socket_id = None if created is None else (created.st_dev, created.st_ino)
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        server = self._server
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+        except (NotImplementedError, AttributeError):
+            pass
+        try:
+            await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            # Only unlink the socket this server bound, not whatever replaced it since.
+            current = self._stat()
+            if current is not None and stat.S_ISSOCK(current.st_mode) \
+                    and (current.st_dev, current.st_ino) == self._socket_id:
+                os.remove(self.path)
+            self._socket_id = None
+
+
+class FigureClient:
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.path)
+        return connection
+
+    def request(self, lines):
+        responses = StringIO()
+        self.stream(StringIO(''.join(f'{line}\n' for line in lines)), responses)
+        return responses.getvalue().splitlines()
+
+    def stream(self, source, target):
+        connection = self._connect()
+
+        # Requests are sent from a second thread so a large input cannot fill both socket
+        # buffers while nobody reads the responses.
+        def send():
+            try:
+                for chunk in iter(lambda: source.read(1 << 16), ''):
+                    connection.sendall(chunk.encode('utf-8'))
+            finally:
+                connection.shutdown(socket.SHUT_WR)
+
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        with connection, connection.makefile('r', encoding='utf-8', newline='\n') as responses:
+            for chunk in iter(lambda: responses.read(1 << 16), ''):
+                target.write(chunk)
+        sender.join()
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m Figures.Code.figures',
+        description='Create figures from text descriptions or at random. Run without arguments for the interactive menu.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', metavar='FILE', help="read figure descriptions from FILE, or '-' for STDIN")
+    source.add_argument('--random', metavar='N', type=int, help='generate N random figures')
+    source.add_argument('--serve', metavar='SOCKET', help='run as a daemon answering figure lines on a Unix socket')
+    source.add_argument('--client', metavar='SOCKET', help='send STDIN to a daemon and print its responses')
+    parser.add_argument('--seed', type=int, help='seed for --random')
+    parser.add_argument('--format', choices=('text', 'binary', 'json'), default='text', help='output format (default: text)')
+    parser.add_argument('--output', metavar='FILE', default='-', help="write to FILE instead of STDOUT")
+    parser.add_argument('--max-figures', metavar='N', type=int, help='stop with an error after N input figures')
+    parser.add_argument('--chunk-size', metavar='N', type=int, default=65536, help='figures per output write (default: 65536)')
+    parser.add_argument('--stats', action='store_true', help='print perimeter statistics to STDERR')
+    parser.add_argument('--skip-errors', action='store_true',
+                        help='skip invalid input lines instead of stopping at the first one')
+    parser.add_argument('--quarantine', metavar='FILE',
+                        help='record skipped lines to FILE as JSON lines (implies --skip-errors)')
+    parser.add_argument('--max-error-rate', metavar='RATE', type=float,
+                        help='fail once more than this fraction of lines is skipped (implies --skip-errors)')
+    parser.add_argument('--timings', action='store_true', help='print per-stage timings to STDERR')
+    parser.add_argument('--profile', metavar='FILE', help='run under cProfile and write a report to FILE')
+    parser.add_argument('--tracemalloc', metavar='FILE', help='trace allocations and write a report to FILE')
+    return parser
+
+
+def _iter_chunks(args, timer=None, quarantine=None):
+    if args.random is not None:
+        if np is not None:
+            generator = np.random.default_rng(args.seed)
+            for start in range(0, args.random, args.chunk_size):
+                yield RandomFigureFactory().create_random_batch(min(args.chunk_size, args.random - start), seed=generator)
+            return
+        random.seed(args.seed)
+        yield from RandomFigureFactory().iter_random_figures(args.random, chunk_size=args.chunk_size)
+        return
+
+    if args.input == '-':
+        try:
+            stream = PipeLineReader(sys.stdin.fileno())
+        except (OSError, ValueError, AttributeError):
+            stream = sys.stdin
+        # STDOUT carries the data, so the 'exit' notice goes to STDERR.
+        factory = StreamFigureFactory(stream, input_mode="stdin", max_figures=args.max_figures, timer=timer,
+                                      quarantine=quarantine, messages=sys.stderr)
+        yield from factory.iter_figures(chunk_size=args.chunk_size)
+    else:
+        with open(args.input, "r") as stream:
+            factory = StreamFigureFactory(stream, input_mode="file", max_figures=args.max_figures, timer=timer,
+                                          quarantine=quarantine)
+            yield from factory.iter_figures(chunk_size=args.chunk_size)
+    if quarantine is not None:
+        quarantine.check(factory.line_number)
+
+
+def _format_json(figure):
+    return json.dumps({
+        'type': FigureRegistry.of(type(figure)).name,
+        'dimensions': list(figure.dimensions),
+        'perimeter': figure.get_perimeter(),
+    })
+
+
+def _run_cli(argv):
+    args = _build_parser().parse_args(argv)
+    if args.chunk_size <= 0:
+        print('Error: The chunk size must be positive!', file=sys.stderr)
+        return 2
+    if args.random is not None and args.random <= 0:
+        print('Error: The number of figures must be positive!', file=sys.stderr)
+        return 2
+
+    if args.serve:
+        try:
+            asyncio.run(FigureServer(args.serve).serve_forever())
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        return 0
+    if args.client:
+        try:
+            FigureClient(args.client).stream(sys.stdin, sys.stdout)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    timer = StageTimer() if args.timings else None
+    profiler = cProfile.Profile() if args.profile else None
+    if args.tracemalloc:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        return _process(args, timer)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        if args.tracemalloc:
+            _write_tracemalloc_report(args.tracemalloc)
+        if profiler is not None:
+            with open(args.profile, 'w') as report:
+                pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(50)
+        if timer is not None:
+            print(timer.report(), file=sys.stderr)
+
+
+def _write_tracemalloc_report(file_path, limit=25):
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with open(file_path, 'w') as report:
+        report.write(f'current: {current:,} bytes\npeak: {peak:,} bytes\n\ntop {limit} allocation sites:\n')
+        for statistic in snapshot.statistics('lineno')[:limit]:
+            report.write(f'{statistic}\n')
+
+
+def _process(args, timer):
+    aggregator = PerimeterAggregator() if args.stats else None
+    batches = []
+    binary = args.format == 'binary'
+    quarantine = None
+    try:
+        if args.skip_errors or args.quarantine or args.max_error_rate is not None:
+            sidecar = None if args.quarantine is None else open(args.quarantine, 'w', buffering=1 << 20)
+            quarantine = Quarantine(sidecar, args.max_error_rate)
+        if args.output == '-':
+            output = sys.stdout.buffer if binary else sys.stdout
+            close = False
+        else:
+            output = open(args.output, 'wb' if binary else 'w')
+            close = True
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    writer = None if binary else FigureWriter(output, timer=timer)
+    # STDIN chunks end when the feed pauses, so each one is written out as soon as it is complete.
+    streaming = writer is not None and args.input == '-'
+
+    try:
+        for chunk in _iter_chunks(args, timer, quarantine):
+            if aggregator is not None:
+                aggregator.consume([chunk])
+            if binary:
+                batches.append(chunk if isinstance(chunk, FigureBatch) else FigureBatch.from_figures(chunk))
+            elif args.format == 'json':
+                start = None if timer is None else timer.clock()
+                lines = [_format_json(figure) for figure in chunk]
+                if start is not None:
+                    timer.add('format', timer.clock() - start)
+                writer.write_lines(lines)
+            else:
+                writer.write_chunk(chunk)
+            if streaming:
+                writer.flush()
+        if binary:
+            output.write(FigureBatch.concat(batches).to_bytes())
+    except BrokenPipeError:
+        # The reader went away, as with '| head': stop quietly. Whatever is still buffered has
+        # nowhere to go, so the output is pointed at devnull for the flushes that follow.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, output.fileno())
+        os.close(devnull)
+        return 1
+    except (ValueError, OverflowError, OSError, ImportError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if writer is not None:
+            writer.flush()
+        output.flush()
+        if close:
+            output.close()
+        if aggregator is not None:
+            print(json.dumps(aggregator.summary(), indent=2, allow_nan=False), file=sys.stderr)
+        if quarantine is not None:
+            if quarantine.stream is not None:
+                quarantine.stream.close()
+            print(quarantine.report(), file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv:
+        return _run_cli(argv)
 
-def main():
     print("Choose the input method you prefer:")
     print("1. Read from a file")
     print("2. Read from STDIN")
@@ -163,34 +2122,28 @@ def main():
         if input_type == "random":
             num_figures = int(input("Enter the number of random figures to create (max: 1000): ").strip())
             figures = factory.create_random_figures(num_figures)
-            for figure in figures:
-                print(f"Created random figure: {figure}")
+            with FigureWriter(sys.stdout, prefix="Created random figure: ") as writer:
+                writer.write_many(figures)
         else:
-            results = []
-            while True:
+            with FigureWriter(sys.stdout, prefix="Created figure: ") as writer:
                 try:
-                    figure = factory.create_figure()
-                    if figure is None:
-                        break
-                    results.append(str(figure))
-                except OverflowError as e:
+                    for chunk in factory.iter_figures(chunk_size=4096):
+                        writer.write_many(chunk)
+                except (OverflowError, ValueError) as e:
+                    writer.flush()
                     print(f"Error: {e}")
-                    break
-                except ValueError as e:
-                    print(f"Error: {e}")
-                    break
 
-            if input_type == "file" and not results:
+            if input_type == "file" and not writer.figures_written:
                 print("No input provided in file!")
-            for result in results:
-                print(f"Created figure: {result}")
     except ValueError as e:
         print(f"Error: {e}")
 
 class Triangle(Figure, Prototype):
     __slots__ = ('__a', '__b', '__c')
+    random_ranges = ((1, 100),) * 3
 
-    def __init__(self, a, b, c):
+    @staticmethod
+    def validate(a, b, c):
         if not isinstance(a, (int, float)) or not isinstance(b, (int, float)) or not isinstance(c, (int, float)):
             raise TypeError('a, b, c must be integers or floats!')
         if a <= 0 or b <= 0 or c <= 0:
@@ -200,6 +2153,17 @@ class Triangle(Figure, Prototype):
         if not (a + b > c and a + c > b and b + c > a):
             raise ValueError('Triangle inequality is violated!')
 
+    @classmethod
+    def validate_many(cls, a, b, c):
+        (a, b, c), codes = _numeric_columns(a, b, c)
+        codes[(codes == VALID) & ((a <= 0) | (b <= 0) | (c <= 0))] = NOT_POSITIVE
+        codes[(codes == VALID) & (a + b + c > (10 ** 8))] = TOO_BIG
+        codes[(codes == VALID) & ~((a + b > c) & (a + c > b) & (b + c > a))] = INEQUALITY_VIOLATED
+        return codes == VALID, codes
+
+    def __init__(self, a, b, c):
+        self.validate(a, b, c)
+
         self.__a = a
         self.__b = b
         self.__c = c
@@ -216,19 +2180,57 @@ class Triangle(Figure, Prototype):
     def c(self):
         return self.__c
 
+    @property
+    def dimensions(self):
+        return self.__a, self.__b, self.__c
+
     def get_perimeter(self):
         return self.__a + self.__b + self.__c
 
+    @classmethod
+    def perimeter_many(cls, a, b, c):
+        return a + b + c
+
+    # Heron's formula rearranged as in Kahan's "Miscalculating Area and Angles of a
+    # Needle-like Triangle": with a >= b >= c the brackets must stay as written, which
+    # avoids the cancellation of the textbook s(s - a)(s - b)(s - c) form.
+    def get_area(self):
+        a, b, c = sorted((self.__a, self.__b, self.__c), reverse=True)
+        return 0.25 * math.sqrt((a + (b + c)) * (c - (a - b)) * (c + (a - b)) * (a + (b - c)))
+
+    @classmethod
+    def area_many(cls, a, b, c):
+        a, b, c = -np.sort(-np.stack((a, b, c)), axis=0)
+        return 0.25 * np.sqrt((a + (b + c)) * (c - (a - b)) * (c + (a - b)) * (a + (b - c)))
+
+    @classmethod
+    def random_columns(cls, generator, count):
+        # Same distribution as RandomFigureFactory._create_random_triangle.
+        low, high = (round(limit * 100) for limit in FigureRegistry.of(cls).ranges[0])
+        a = generator.integers(low, high + 1, count)
+        b = generator.integers(low, high + 1, count)
+        c = generator.integers(np.maximum(low, np.abs(a - b) + 1), np.minimum(high, a + b - 1) + 1)
+        return a / 100, b / 100, c / 100
+
     def __str__(self):
         return f'triangle {self.__a} {self.__b} {self.__c}'
 
+    @classmethod
+    def format_many(cls, a, b, c):
+        return [f'triangle {a} {b} {c}' for a, b, c in zip(a.tolist(), b.tolist(), c.tolist())]
+
     def clone(self):
-        return deepcopy(self)
+        clone = object.__new__(type(self))
+        clone.__a = self.__a
+        clone.__b = self.__b
+        clone.__c = self.__c
+        return clone
 
 class Square(Figure, Prototype):
     __slots__ = ('__a',)
 
-    def __init__(self, a):
+    @staticmethod
+    def validate(a):
         if not isinstance(a, (int, float)):
             raise TypeError('a must be an integer or float!')
         if a <= 0:
@@ -236,26 +2238,58 @@ class Square(Figure, Prototype):
         if 4 * a > (10 ** 8):
             raise OverflowError('Dimensions are too big!')
 
+    @classmethod
+    def validate_many(cls, a):
+        (a,), codes = _numeric_columns(a)
+        codes[(codes == VALID) & (a <= 0)] = NOT_POSITIVE
+        codes[(codes == VALID) & (4 * a > (10 ** 8))] = TOO_BIG
+        return codes == VALID, codes
+
+    def __init__(self, a):
+        self.validate(a)
+
         self.__a = a
 
     @property
     def a(self):
         return self.__a
 
+    @property
+    def dimensions(self):
+        return self.__a,
+
     def get_perimeter(self):
         return 4 * self.__a
 
+    @classmethod
+    def perimeter_many(cls, a):
+        return 4 * a
+
+    def get_area(self):
+        return self.__a * self.__a
+
+    @classmethod
+    def area_many(cls, a):
+        return a * a
+
     def __str__(self):
         return f'square {self.__a}'
 
+    @classmethod
+    def format_many(cls, a):
+        return [f'square {value}' for value in a.tolist()]
+
     def clone(self):
-        return deepcopy(self)
+        clone = object.__new__(type(self))
+        clone.__a = self.__a
+        return clone
 
 
 class Rectangle(Figure, Prototype):
     __slots__ = ('__a', '__b')
 
-    def __init__(self, a, b):
+    @staticmethod
+    def validate(a, b):
         if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
             raise TypeError('a, b must be integers or floats!')
         if a <= 0 or b <= 0:
@@ -263,6 +2297,16 @@ class Rectangle(Figure, Prototype):
         if 2 * (a + b) > (10 ** 8):
             raise OverflowError('Dimensions are too big!')
 
+    @classmethod
+    def validate_many(cls, a, b):
+        (a, b), codes = _numeric_columns(a, b)
+        codes[(codes == VALID) & ((a <= 0) | (b <= 0))] = NOT_POSITIVE
+        codes[(codes == VALID) & (2 * (a + b) > (10 ** 8))] = TOO_BIG
+        return codes == VALID, codes
+
+    def __init__(self, a, b):
+        self.validate(a, b)
+
         self.__a = a
         self.__b = b
 
@@ -274,19 +2318,42 @@ class Rectangle(Figure, Prototype):
     def b(self):
         return self.__b
 
+    @property
+    def dimensions(self):
+        return self.__a, self.__b
+
     def get_perimeter(self):
         return 2 * (self.__a + self.__b)
 
+    @classmethod
+    def perimeter_many(cls, a, b):
+        return 2 * (a + b)
+
+    def get_area(self):
+        return self.__a * self.__b
+
+    @classmethod
+    def area_many(cls, a, b):
+        return a * b
+
     def __str__(self):
         return f'rectangle {self.__a} {self.__b}'
 
+    @classmethod
+    def format_many(cls, a, b):
+        return [f'rectangle {a} {b}' for a, b in zip(a.tolist(), b.tolist())]
+
     def clone(self):
-        return deepcopy(self)
+        clone = object.__new__(type(self))
+        clone.__a = self.__a
+        clone.__b = self.__b
+        return clone
 
 class Circle(Figure, Prototype):
     __slots__ = ('__radius',)
 
-    def __init__(self, radius):
+    @staticmethod
+    def validate(radius):
         if not isinstance(radius, (int, float)):
             raise TypeError('Radius must be an integer or float!')
         if radius <= 0:
@@ -294,21 +2361,52 @@ class Circle(Figure, Prototype):
         if math.pi * radius > (10 ** 8):
             raise OverflowError('Radius is too big!')
 
+    @classmethod
+    def validate_many(cls, radius):
+        (radius,), codes = _numeric_columns(radius)
+        codes[(codes == VALID) & (radius <= 0)] = NOT_POSITIVE
+        codes[(codes == VALID) & (np.pi * radius > (10 ** 8))] = TOO_BIG
+        return codes == VALID, codes
+
+    def __init__(self, radius):
+        self.validate(radius)
+
         self.__radius = radius
 
     @property
     def radius(self):
         return self.__radius
 
+    @property
+    def dimensions(self):
+        return self.__radius,
+
     def get_perimeter(self):
         perimeter = 2 * math.pi * self.__radius
         return round(perimeter, 2)
 
+    @classmethod
+    def perimeter_many(cls, radius):
+        return _round_many(2 * np.pi * radius, 2)
+
+    def get_area(self):
+        return math.pi * self.__radius * self.__radius
+
+    @classmethod
+    def area_many(cls, radius):
+        return np.pi * radius * radius
+
     def __str__(self):
         return f'circle {self.__radius}'
 
+    @classmethod
+    def format_many(cls, radius):
+        return [f'circle {value}' for value in radius.tolist()]
+
     def clone(self):
-        return deepcopy(self)
+        clone = object.__new__(type(self))
+        clone.__radius = self.__radius
+        return clone
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
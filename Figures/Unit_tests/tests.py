@@ -1,12 +1,29 @@
+import asyncio
+import gc
+import tracemalloc
 import math
+import statistics
 import unittest
 from copy import deepcopy
-from io import StringIO
+from io import StringIO, BytesIO, TextIOWrapper
+from contextlib import redirect_stdout, redirect_stderr
 from collections import Counter
 from unittest.mock import patch, mock_open
 import inspect
+import json
+import os
+import select
+import socket
+import subprocess
+import sys
+import tempfile
 
-from Figures.Code.figures import Triangle, Square, Rectangle, Circle, FigureFactory, StreamFigureFactory, main, RandomFigureFactory, AbstractFigureFactory, Figure
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from Figures.Code.figures import Triangle, Square, Rectangle, Circle, FigureFactory, StreamFigureFactory, main, RandomFigureFactory, AbstractFigureFactory, Figure, FigureRegistry, FigureBatch, VALID, INVALID_TYPE, NOT_POSITIVE, TOO_BIG, INEQUALITY_VIOLATED, INVALID_VALUE, MappedFigureFactory, FigureInternPool, ParseCache, TDigest, PerimeterStats, PerimeterAggregator, PerimeterIndex, AsyncStreamFigureFactory, FigureWriter, StageTimer, FigureServer, FigureClient, Quarantine, PipeLineReader
 
 
 class TestTriangle(unittest.TestCase):
@@ -715,4 +732,1372 @@ class TestReflection(unittest.TestCase):
         figures = factory.create_random_figures(5)
         self.assertEqual(len(figures), 5)
         for figure in figures:
-            self.assertIsInstance(figure, Figure)
\ No newline at end of file
+            self.assertIsInstance(figure, Figure)
+
+class TestFigureRegistry(unittest.TestCase):
+    def test_builtin_figures_are_registered(self):
+        self.assertEqual(FigureRegistry.get("triangle").cls, Triangle)
+        self.assertEqual(FigureRegistry.get("Square").cls, Square)
+        self.assertEqual(FigureRegistry.get("rectangle").arity, 2)
+        self.assertEqual(FigureRegistry.get("circle").arity, 1)
+
+    def test_validator_is_registered(self):
+        entry = FigureRegistry.get("triangle")
+        with self.assertRaises(ValueError) as ex:
+            entry.validator(1, 2, 10)
+        self.assertEqual(str(ex.exception), "Triangle inequality is violated!")
+
+    def test_abstract_subclass_is_not_registered(self):
+        class Shape(Figure):
+            pass
+
+        self.assertIsNone(FigureRegistry.get("shape"))
+
+    def test_plugin_figure_registers_itself(self):
+        class Hexagon(Figure):
+            __slots__ = ('side',)
+
+            def __init__(self, side):
+                self.side = side
+
+            def get_perimeter(self):
+                return 6 * self.side
+
+            def get_area(self):
+                return 0
+
+            def __str__(self):
+                return f'hexagon {self.side}'
+
+        try:
+            figure = FigureFactory.create_figure("hexagon 2")
+            self.assertIsInstance(figure, Hexagon)
+            self.assertEqual(figure.get_perimeter(), 12)
+        finally:
+            FigureRegistry.unregister("hexagon")
+
+        with self.assertRaises(ValueError):
+            FigureFactory.create_figure("hexagon 2")
+
+    def test_wrong_arity_is_rejected_before_construction(self):
+        with self.assertRaises(ValueError) as ex:
+            FigureFactory.create_figure("circle 1 2")
+        self.assertEqual(str(ex.exception), "Incorrect parameters for Circle: [1.0, 2.0]")
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestFigureBatch(unittest.TestCase):
+    def setUp(self):
+        self.figures = [Triangle(3.0, 4.0, 5.0), Circle(7.0), Square(4.0), Rectangle(8.0, 5.0), Circle(1.5)]
+        self.batch = FigureBatch.from_figures(self.figures)
+
+    def test_columns_are_float64_per_type(self):
+        self.assertEqual(len(self.batch), 5)
+        self.assertEqual([entry.name for entry in self.batch.types], ["triangle", "circle", "square", "rectangle"])
+        circle_columns = self.batch.columns[1]
+        self.assertEqual(len(circle_columns), 1)
+        self.assertEqual(circle_columns[0].dtype, np.float64)
+        self.assertEqual(circle_columns[0].tolist(), [7.0, 1.5])
+
+    def test_vectorized_perimeter_matches_scalar(self):
+        perimeters = self.batch.get_perimeter()
+        for perimeter, figure in zip(perimeters.tolist(), self.figures):
+            self.assertEqual(perimeter, figure.get_perimeter())
+
+    def test_circle_rounding_matches_builtin_round(self):
+        radii = np.concatenate(([5727740.637201514], np.random.default_rng(5).uniform(0, 1e7, 200000)))
+        radii = radii[radii > 0]
+        expected = [Circle(radius).get_perimeter() for radius in radii.tolist()]
+        self.assertEqual(Circle.perimeter_many(radii).tolist(), expected)
+        self.assertEqual(FigureBatch.from_columns("circle", radii[:1]).get_perimeter().tolist(), [35988455.81])
+
+    def test_indexing_materializes_figures(self):
+        self.assertIsInstance(self.batch[1], Circle)
+        self.assertEqual(str(self.batch[-1]), "circle 1.5")
+        self.assertEqual([str(figure) for figure in self.batch], [str(figure) for figure in self.figures])
+        with self.assertRaises(IndexError):
+            self.batch[5]
+
+    def test_from_columns_keeps_validation_rules(self):
+        batch = FigureBatch.from_columns("rectangle", [1.0, 2.0], [3.0, 4.0])
+        self.assertEqual(batch.get_perimeter().tolist(), [8.0, 12.0])
+
+        with self.assertRaises(ValueError) as ex:
+            FigureBatch.from_columns("triangle", [3.0, 1.0], [4.0, 2.0], [5.0, 10.0])
+        self.assertEqual(str(ex.exception), "Triangle inequality is violated!")
+
+        with self.assertRaises(OverflowError) as ex:
+            FigureBatch.from_columns("circle", [35000000.0])
+        self.assertEqual(str(ex.exception), "Radius is too big!")
+
+    def test_unknown_type_is_rejected(self):
+        with self.assertRaises(ValueError) as ex:
+            FigureBatch.from_columns("pentagon", [1.0])
+        self.assertEqual(str(ex.exception), "Unknown or invalid figure type: Pentagon")
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestValidateMany(unittest.TestCase):
+    def test_triangle_error_codes(self):
+        mask, codes = Triangle.validate_many([3, -1, 10000000, 2], [4, 5, 10000000, 2], [5, 3, 90000000, 4])
+        self.assertEqual(mask.tolist(), [True, False, False, False])
+        self.assertEqual(codes.tolist(), [VALID, NOT_POSITIVE, TOO_BIG, INEQUALITY_VIOLATED])
+
+    def test_square_error_codes(self):
+        mask, codes = Square.validate_many(np.array([3.5, 0.0, 30000000.0]))
+        self.assertEqual(mask.tolist(), [True, False, False])
+        self.assertEqual(codes.tolist(), [VALID, NOT_POSITIVE, TOO_BIG])
+
+    def test_rectangle_error_codes(self):
+        mask, codes = Rectangle.validate_many([3, -2, 30000000], [4, 3, 25000000])
+        self.assertEqual(codes.tolist(), [VALID, NOT_POSITIVE, TOO_BIG])
+
+    def test_circle_rejects_non_numeric_rows(self):
+        mask, codes = Circle.validate_many(np.array([3, '3', 35000000.0], dtype=object))
+        self.assertEqual(mask.tolist(), [True, False, False])
+        self.assertEqual(codes.tolist(), [VALID, INVALID_TYPE, TOO_BIG])
+
+    def test_string_columns_are_invalid_type(self):
+        mask, codes = Square.validate_many(['3', '4'])
+        self.assertFalse(mask.any())
+        self.assertEqual(codes.tolist(), [INVALID_TYPE, INVALID_TYPE])
+
+    def test_codes_agree_with_scalar_constructor(self):
+        sides = [(3, 4, 5), (1, 2, 10), (0, 3, 4), (2.5, 2.5, 4.9)]
+        mask, _ = Triangle.validate_many(*zip(*sides))
+        for valid, (a, b, c) in zip(mask.tolist(), sides):
+            try:
+                Triangle(a, b, c)
+                constructed = True
+            except (ValueError, OverflowError):
+                constructed = False
+            self.assertEqual(valid, constructed)
+
+    def test_plugin_figures_fall_back_to_row_validation(self):
+        class Pentagon(Figure):
+            __slots__ = ('side',)
+
+            @staticmethod
+            def validate(side):
+                if side <= 0:
+                    raise ValueError('side must be positive!')
+
+            def __init__(self, side):
+                self.validate(side)
+                self.side = side
+
+            def get_perimeter(self):
+                return 5 * self.side
+
+            def get_area(self):
+                return 0
+
+        try:
+            mask, codes = Pentagon.validate_many([1.0, -1.0])
+            self.assertEqual(codes.tolist(), [VALID, INVALID_VALUE])
+        finally:
+            FigureRegistry.unregister("pentagon")
+
+
+class TestIterFigures(unittest.TestCase):
+    def test_yields_figures_lazily(self):
+        stream = StringIO("circle 5\nsquare 4\nrectangle 8 5\n")
+        factory = StreamFigureFactory(stream, input_mode="file")
+        figures = factory.iter_figures()
+        self.assertEqual(str(next(figures)), "circle 5.0")
+        self.assertEqual(stream.tell(), len("circle 5\n"))
+        self.assertEqual([str(figure) for figure in figures], ["square 4.0", "rectangle 8.0 5.0"])
+
+    def test_stops_at_exit_in_stdin(self):
+        factory = StreamFigureFactory(StringIO("square 20\nexit\ncircle 1\n"), input_mode="stdin")
+        self.assertEqual([str(figure) for figure in factory], ["square 20.0"])
+
+    def test_chunked_lists(self):
+        lines = "".join(f"circle {i}\n" for i in range(1, 8))
+        factory = StreamFigureFactory(StringIO(lines), input_mode="file")
+        chunks = list(factory.iter_figures(chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual(str(chunks[2][0]), "circle 7.0")
+
+    def test_partial_chunk_is_yielded_before_error(self):
+        factory = StreamFigureFactory(StringIO("circle 1\ncircle 2\ncircle -3\n"), input_mode="file")
+        chunks = factory.iter_figures(chunk_size=10)
+        self.assertEqual(len(next(chunks)), 2)
+        with self.assertRaises(ValueError) as ex:
+            next(chunks)
+        self.assertEqual(str(ex.exception), "Radius must be positive and non-zero!")
+
+    def test_invalid_chunk_size(self):
+        factory = StreamFigureFactory(StringIO("circle 1\n"), input_mode="file")
+        with self.assertRaises(ValueError):
+            next(factory.iter_figures(chunk_size=0))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_chunked_batches(self):
+        lines = "triangle 3 4 5\ncircle 1\nsquare 2\n"
+        factory = StreamFigureFactory(StringIO(lines), input_mode="file")
+        batches = list(factory.iter_figures(chunk_size=2, as_batch=True))
+        self.assertTrue(all(isinstance(batch, FigureBatch) for batch in batches))
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertEqual(batches[0].get_perimeter().tolist(), [12.0, 6.28])
+
+
+class TestUnboundedIngestion(unittest.TestCase):
+    def test_default_caps_are_kept(self):
+        self.assertEqual(StreamFigureFactory(StringIO(""), input_mode="stdin").max_figures, 1000)
+        self.assertEqual(StreamFigureFactory(StringIO(""), input_mode="file").max_figures, 10000)
+
+    def test_unbounded_stream_goes_past_the_cap(self):
+        lines = "square 1\n" * 10005
+        factory = StreamFigureFactory(StringIO(lines), input_mode="file", max_figures=None)
+        self.assertEqual(sum(len(chunk) for chunk in factory.iter_figures(chunk_size=1000)), 10005)
+
+    def test_memory_budget_bounds_each_chunk(self):
+        lines = "circle 10\n" * 100
+        factory = StreamFigureFactory(StringIO(lines), input_mode="file", max_figures=None)
+        chunks = list(factory.iter_figures(max_bytes=100))
+        self.assertEqual([len(chunk) for chunk in chunks], [10] * 10)
+        self.assertEqual(factory.bytes_read, len(lines))
+
+    def test_chunks_are_read_on_demand(self):
+        stream = StringIO("circle 10\n" * 100)
+        factory = StreamFigureFactory(stream, input_mode="file", max_figures=None)
+        chunks = factory.iter_figures(chunk_size=5)
+        next(chunks)
+        self.assertEqual(stream.tell(), 50)
+
+    def test_custom_cap_still_raises(self):
+        factory = StreamFigureFactory(StringIO("square 1\nsquare 2\n"), input_mode="file", max_figures=1)
+        figures = factory.iter_figures()
+        next(figures)
+        with self.assertRaises(OverflowError):
+            next(figures)
+
+    def test_random_figures_stream_without_cap(self):
+        chunks = list(RandomFigureFactory().iter_random_figures(2500, chunk_size=1000))
+        self.assertEqual([len(chunk) for chunk in chunks], [1000, 1000, 500])
+        self.assertTrue(all(isinstance(figure, Figure) for chunk in chunks for figure in chunk))
+
+
+class TempFileMixin:
+    def write(self, content):
+        handle, path = tempfile.mkstemp(suffix=".txt")
+        with os.fdopen(handle, "wb") as file:
+            file.write(content if isinstance(content, bytes) else content.encode())
+        self.addCleanup(os.remove, path)
+        return path
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestMappedFigureFactory(TempFileMixin, unittest.TestCase):
+    def test_matches_stream_factory(self):
+        content = "triangle 3 4 5\ncircle 7.25\nsquare 4\nrectangle 8 .5\nCircle 0.1\n"
+        batch = MappedFigureFactory(self.write(content)).create_batch()
+        expected = list(StreamFigureFactory(StringIO(content), input_mode="file").iter_figures())
+        self.assertEqual([str(figure) for figure in batch], [str(figure) for figure in expected])
+        self.assertEqual(batch.get_perimeter().tolist(), FigureBatch.from_figures(expected).get_perimeter().tolist())
+
+    def test_numbers_match_float_for_every_token_shape(self):
+        tokens = ["5.", ".5", "0.1", "7", "12345678", "1234567.8", "0.000001", "99999.99",
+                  "1234.56789125", "4503.599627370497", "0.30000000000000004"]
+        content = "".join(f"CIRCLE {token}\nRecTangle {token} {token}\n" for token in tokens)
+        batch = MappedFigureFactory(self.write(content)).create_batch()
+        expected = [float(token) for token in tokens for _ in range(3)]
+        self.assertEqual([value for figure in batch for value in figure.dimensions], expected)
+
+    def test_malformed_numbers_fall_back_to_scalar_errors(self):
+        for token in ("1.2.3", ".", "1..", "1a", "12345678.9.1"):
+            with self.assertRaises(ValueError):
+                MappedFigureFactory(self.write(f"square 2.5\ncircle {token}\n")).create_batch()
+
+    def test_irregular_whitespace_and_exponents(self):
+        content = "  triangle\t3 4   5 \r\ncircle 1e2\nsquare 1_0\n"
+        batch = MappedFigureFactory(self.write(content)).create_batch()
+        self.assertEqual([str(figure) for figure in batch], ["triangle 3.0 4.0 5.0", "circle 100.0", "square 10.0"])
+
+    def test_small_blocks_keep_order_and_line_numbers(self):
+        lines = [f"square {i}" for i in range(1, 50)] + ["circle -1"]
+        path = self.write("\n".join(lines))
+        with self.assertRaises(ValueError) as ex:
+            MappedFigureFactory(path, block_size=32).create_batch()
+        self.assertEqual(str(ex.exception), "Line 50: Radius must be positive and non-zero!")
+
+        batch = FigureBatch.concat(MappedFigureFactory(self.write("\n".join(lines[:-1])), block_size=32).iter_batches())
+        self.assertEqual([figure.a for figure in batch], [float(i) for i in range(1, 50)])
+
+    def test_errors_keep_scalar_messages(self):
+        with self.assertRaises(OverflowError) as ex:
+            MappedFigureFactory(self.write("circle 1\nsquare 30000000\n")).create_batch()
+        self.assertEqual(str(ex.exception), "Line 2: Dimensions are too big!")
+
+        with self.assertRaises(ValueError) as ex:
+            MappedFigureFactory(self.write("circle 1\npentagon 10\n")).create_batch()
+        self.assertEqual(str(ex.exception), "Line 2: Unknown or invalid figure type: Pentagon")
+
+    def test_invalid_utf8_reports_line_number(self):
+        with self.assertRaises(ValueError) as ex:
+            MappedFigureFactory(self.write(b"circle 1\ncircle \xff\n")).create_batch()
+        self.assertEqual(type(ex.exception), ValueError)
+        self.assertTrue(str(ex.exception).startswith("Line 2: 'utf-8' codec can't decode byte 0xff"))
+        self.assertEqual(ex.exception.line_number, 2)
+
+    def test_exit_in_file_is_an_error(self):
+        with self.assertRaises(ValueError) as ex:
+            MappedFigureFactory(self.write("circle 1\nexit\n")).create_batch()
+        self.assertEqual(str(ex.exception), "Line 2: Invalid input in file: there should not be 'exit' in file!")
+
+    def test_blank_line_ends_input(self):
+        batch = MappedFigureFactory(self.write("circle 1\n\ncircle 2\n")).create_batch()
+        self.assertEqual(len(batch), 1)
+
+    def test_empty_file(self):
+        for content in ("", "\n"):
+            with self.assertRaises(ValueError) as ex:
+                MappedFigureFactory(self.write(content)).create_batch()
+            self.assertEqual(str(ex.exception), "No input provided in file!")
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestParallelParsing(TempFileMixin, unittest.TestCase):
+    def test_shards_are_merged_in_order(self):
+        lines = [f"circle {i}" if i % 3 else f"rectangle {i} {i + 1}" for i in range(1, 301)]
+        path = self.write("\n".join(lines) + "\n")
+        sequential = MappedFigureFactory(path, block_size=256).create_batch()
+        parallel = MappedFigureFactory(path, block_size=256).create_batch(workers=2)
+        self.assertEqual(len(parallel), 300)
+        self.assertEqual([str(figure) for figure in parallel], [str(figure) for figure in sequential])
+
+    def test_errors_report_global_line_number(self):
+        lines = [f"square {i}" for i in range(1, 200)] + ["triangle 1 2 10"] + ["square 1"] * 50
+        path = self.write("\n".join(lines))
+        with self.assertRaises(ValueError) as ex:
+            MappedFigureFactory(path, block_size=128).create_batch(workers=2)
+        self.assertEqual(str(ex.exception), "Line 200: Triangle inequality is violated!")
+
+    def test_invalid_utf8_in_later_shard_reports_line_number(self):
+        path = self.write(b"square 1\n" * 100 + b"circle \xff\n")
+        with self.assertRaises(ValueError) as ex:
+            MappedFigureFactory(path, block_size=64).create_batch(workers=2)
+        self.assertEqual(type(ex.exception), ValueError)
+        self.assertTrue(str(ex.exception).startswith("Line 101: 'utf-8' codec can't decode byte 0xff"))
+
+    def test_exit_in_later_shard_is_an_error(self):
+        path = self.write("square 1\n" * 100 + "exit\n")
+        with self.assertRaises(ValueError) as ex:
+            MappedFigureFactory(path, block_size=64).create_batch(workers=2)
+        self.assertEqual(str(ex.exception), "Line 101: Invalid input in file: there should not be 'exit' in file!")
+
+    def test_blank_line_stops_later_shards(self):
+        path = self.write("square 1\n" * 20 + "\n" + "square -1\n" * 20)
+        batch = MappedFigureFactory(path, block_size=64).create_batch(workers=2)
+        self.assertEqual(len(batch), 20)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestRandomBatch(unittest.TestCase):
+    def test_batch_is_reproducible_from_seed(self):
+        factory = RandomFigureFactory()
+        first = factory.create_random_batch(500, seed=42)
+        second = factory.create_random_batch(500, seed=42)
+        self.assertIsInstance(first, FigureBatch)
+        self.assertTrue(np.array_equal(first.codes, second.codes))
+        self.assertTrue(np.array_equal(first.get_perimeter(), second.get_perimeter()))
+        self.assertFalse(np.array_equal(first.codes, factory.create_random_batch(500, seed=7).codes))
+
+    def test_batch_ranges_and_validity(self):
+        batch = RandomFigureFactory().create_random_batch(4000, seed=1)
+        for entry, block in zip(batch.types, batch.columns):
+            for column in block:
+                self.assertGreaterEqual(column.min(), 1)
+                self.assertLessEqual(column.max(), 100 if entry.name == "triangle" else 2000)
+            self.assertTrue(entry.cls.validate_many(*block)[0].all())
+        counts = np.bincount(batch.codes)
+        self.assertTrue(all(abs(count - 1000) < 150 for count in counts.tolist()))
+
+    def test_materialized_figures(self):
+        batch = RandomFigureFactory().create_random_batch(10, seed=3)
+        for figure in batch:
+            self.assertIsInstance(figure, Figure)
+
+    def test_non_positive_count(self):
+        with self.assertRaises(ValueError):
+            RandomFigureFactory().create_random_batch(0)
+
+
+class TestTriangleSampling(unittest.TestCase):
+    def test_every_draw_is_a_valid_triangle(self):
+        for _ in range(500):
+            sides = RandomFigureFactory._create_random_triangle().dimensions
+            for side in sides:
+                self.assertGreaterEqual(side, 1)
+                self.assertLessEqual(side, 100)
+                self.assertEqual(round(side, 2), side)
+
+    def test_third_side_is_drawn_from_the_closing_interval(self):
+        with patch("Figures.Code.figures.random.randint", side_effect=[100, 10000, 9901]) as randint:
+            triangle = RandomFigureFactory._create_random_triangle()
+        self.assertEqual(randint.call_args_list[2].args, (9901, 10000))
+        self.assertEqual(str(triangle), "triangle 1.0 100.0 99.01")
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_vectorized_variant(self):
+        a, b, c = Triangle.random_columns(np.random.default_rng(5), 100000)
+        self.assertTrue(Triangle.validate_many(a, b, c)[0].all())
+        self.assertGreaterEqual(min(a.min(), b.min(), c.min()), 1)
+        self.assertLessEqual(max(a.max(), b.max(), c.max()), 100)
+
+
+class TestFigureMetadata(unittest.TestCase):
+    def test_parameter_names_and_ranges(self):
+        entry = FigureRegistry.of(Rectangle)
+        self.assertEqual(entry.params, ("a", "b"))
+        self.assertEqual(entry.ranges, ((1, 2000), (1, 2000)))
+        self.assertEqual(FigureRegistry.of(Triangle).ranges, ((1, 100),) * 3)
+        self.assertEqual(FigureRegistry.schema()["circle"], {"params": ["radius"], "ranges": [[1, 2000]]})
+
+    def test_redefinition_replaces_cached_metadata(self):
+        class Star(Figure):
+            def __init__(self, a):
+                self.points = (a,)
+
+            def get_perimeter(self):
+                return sum(self.points)
+
+            def get_area(self):
+                return 0
+
+        first = Star
+        try:
+            self.assertEqual(FigureRegistry.get("star").params, ("a",))
+
+            class Star(Figure):
+                def __init__(self, a, b):
+                    self.points = (a, b)
+
+                def get_perimeter(self):
+                    return sum(self.points)
+
+                def get_area(self):
+                    return 0
+
+            self.assertIs(FigureRegistry.get("star").cls, Star)
+            self.assertEqual(FigureRegistry.get("star").params, ("a", "b"))
+            self.assertIsNone(FigureRegistry.of(first))
+            self.assertEqual(FigureFactory.create_figure("star 1 2").points, (1.0, 2.0))
+            with self.assertRaises(ValueError):
+                FigureFactory.create_figure("star 1")
+        finally:
+            FigureRegistry.unregister("star")
+
+    def test_refresh_after_constructor_change(self):
+        class Ring(Figure):
+            def __init__(self, radius):
+                self.radius = radius
+
+            def get_perimeter(self):
+                return self.radius
+
+            def get_area(self):
+                return 0
+
+        try:
+            Ring.__init__ = lambda self, inner, outer: None
+            self.assertEqual(FigureRegistry.get("ring").params, ("radius",))
+            FigureRegistry.refresh(Ring)
+            self.assertEqual(FigureRegistry.get("ring").params, ("inner", "outer"))
+        finally:
+            FigureRegistry.unregister("ring")
+
+    def test_random_generation_reads_cached_ranges(self):
+        class Dot(Figure):
+            random_ranges = ((5, 6),)
+
+            def __init__(self, size):
+                self.size = size
+
+            def get_perimeter(self):
+                return self.size
+
+            def get_area(self):
+                return 0
+
+        try:
+            with patch("Figures.Code.figures.inspect.signature", side_effect=AssertionError("not cached")):
+                with patch("Figures.Code.figures.random.choice", return_value=FigureRegistry.get("dot")):
+                    figures = RandomFigureFactory().create_random_figures(20)
+            self.assertTrue(all(5 <= figure.size <= 6 for figure in figures))
+        finally:
+            FigureRegistry.unregister("dot")
+
+
+class TestClone(unittest.TestCase):
+    def test_clone_copies_state_without_deepcopy(self):
+        for figure in (Triangle(3, 4, 5), Square(4), Rectangle(8, 5), Circle(7)):
+            with patch("copy.deepcopy", side_effect=AssertionError("deepcopy used")):
+                clone = figure.clone()
+            self.assertIsNot(clone, figure)
+            self.assertIs(type(clone), type(figure))
+            self.assertEqual(str(clone), str(figure))
+            self.assertEqual(clone.dimensions, figure.dimensions)
+
+    def test_clone_many_objects(self):
+        original = Rectangle(2, 3)
+        clones = original.clone_many(5)
+        self.assertEqual(len(clones), 5)
+        self.assertEqual(len({id(clone) for clone in clones}), 5)
+        self.assertTrue(all(str(clone) == "rectangle 2 3" for clone in clones))
+        self.assertEqual(original.clone_many(0), [])
+        with self.assertRaises(ValueError):
+            original.clone_many(-1)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_clone_many_batch(self):
+        batch = Triangle(3, 4, 5).clone_many(1000, as_batch=True)
+        self.assertIsInstance(batch, FigureBatch)
+        self.assertEqual(len(batch), 1000)
+        self.assertTrue((batch.get_perimeter() == 12).all())
+        self.assertEqual(str(batch[999]), "triangle 3.0 4.0 5.0")
+
+
+class TestValueSemantics(unittest.TestCase):
+    def test_equal_figures_hash_equal(self):
+        self.assertEqual(Circle(5), Circle(5.0))
+        self.assertEqual(hash(Circle(5)), hash(Circle(5.0)))
+        self.assertEqual(Triangle(3, 4, 5), Triangle(3, 4, 5))
+        self.assertNotEqual(Triangle(3, 4, 5), Triangle(3, 5, 4))
+        self.assertNotEqual(Square(4), Circle(4))
+        self.assertNotEqual(Square(4), "square 4")
+
+    def test_set_deduplication(self):
+        figures = [Circle(5), Square(2), Circle(5), Rectangle(1, 2), Square(2.0)]
+        self.assertEqual(len(set(figures)), 3)
+
+    def test_clone_is_equal(self):
+        original = Rectangle(3, 4)
+        self.assertEqual(original.clone(), original)
+
+    def test_plugins_without_readable_dimensions_use_identity(self):
+        class Star(Figure):
+            def __init__(self, a):
+                self.points = (a,)
+
+            def get_perimeter(self):
+                return sum(self.points)
+
+            def get_area(self):
+                return 0
+
+        class Blob(Figure, register=False):
+            def __init__(self, size):
+                self.size = size
+
+            def get_perimeter(self):
+                return self.size
+
+            def get_area(self):
+                return 0
+
+        try:
+            for cls in (Star, Blob):
+                first, second = cls(1), cls(1)
+                self.assertEqual(first, first)
+                self.assertNotEqual(first, second)
+                self.assertEqual(hash(first), hash(first))
+                self.assertEqual(len({first, second, first}), 2)
+        finally:
+            FigureRegistry.unregister("star")
+
+
+class TestInternPool(unittest.TestCase):
+    def test_repeated_lines_share_one_instance(self):
+        pool = FigureInternPool()
+        first = FigureFactory.create_figure("circle 5", pool=pool)
+        second = FigureFactory.create_figure("Circle 5.0", pool=pool)
+        other = FigureFactory.create_figure("circle 6", pool=pool)
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual((pool.hits, pool.misses, len(pool)), (1, 2, 2))
+
+    def test_pool_holds_weak_references(self):
+        pool = FigureInternPool()
+        figure = pool.intern(Square(3))
+        self.assertIs(pool.intern(Square(3)), figure)
+        del figure
+        gc.collect()
+        self.assertEqual(len(pool), 0)
+
+    def test_stream_factory_uses_pool(self):
+        pool = FigureInternPool()
+        factory = StreamFigureFactory(StringIO("square 2\nsquare 2\nsquare 3\n"), input_mode="file", pool=pool)
+        figures = list(factory.iter_figures())
+        self.assertIs(figures[0], figures[1])
+        self.assertEqual(len(set(figures)), 2)
+
+
+class TestParseCache(unittest.TestCase):
+    def test_hot_lines_skip_parsing(self):
+        cache = ParseCache(maxsize=8)
+        first = FigureFactory.create_figure("rectangle 10 20", cache=cache)
+        with patch.object(Rectangle, "validate", side_effect=AssertionError("validated again")):
+            second = FigureFactory.create_figure("  Rectangle   10 20 ", cache=cache)
+        self.assertIs(first, second)
+        self.assertEqual(cache.info(), {"hits": 1, "misses": 1, "evictions": 0, "size": 1, "maxsize": 8})
+
+    def test_least_recently_used_line_is_evicted(self):
+        cache = ParseCache(maxsize=2)
+        for line in ("circle 1", "circle 2", "circle 1", "circle 3"):
+            FigureFactory.create_figure(line, cache=cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get("circle 1"))
+        self.assertIsNone(cache.get("circle 2"))
+
+    def test_invalid_lines_are_not_cached(self):
+        cache = ParseCache()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                FigureFactory.create_figure("circle -1", cache=cache)
+        self.assertEqual((cache.misses, len(cache)), (2, 0))
+
+    def test_stream_factory_uses_cache(self):
+        cache = ParseCache()
+        factory = StreamFigureFactory(StringIO("square 2\n" * 5), input_mode="file", cache=cache)
+        self.assertEqual(len(set(map(id, factory.iter_figures()))), 1)
+        self.assertEqual((cache.hits, cache.misses), (4, 1))
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            ParseCache(0)
+
+
+class TestPerimeterStatistics(unittest.TestCase):
+    def test_running_moments(self):
+        values = [3.5, 12.0, 7.25, 1.0, 9.0]
+        stats = PerimeterStats()
+        for value in values:
+            stats.add(value)
+        self.assertEqual((stats.count, stats.minimum, stats.maximum), (5, 1.0, 12.0))
+        self.assertAlmostEqual(stats.total, sum(values))
+        self.assertAlmostEqual(stats.mean, statistics.mean(values))
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(values))
+        self.assertAlmostEqual(stats.sample_variance, statistics.variance(values))
+
+    def test_merged_shards_match_single_pass(self):
+        values = [float(i % 97) * 1.5 for i in range(2000)]
+        whole, left, right = PerimeterStats(), PerimeterStats(), PerimeterStats()
+        for value in values:
+            whole.add(value)
+        for value in values[:700]:
+            left.add(value)
+        for value in values[700:]:
+            right.add(value)
+        left.merge(right)
+        self.assertEqual(left.count, whole.count)
+        self.assertAlmostEqual(left.mean, whole.mean)
+        self.assertAlmostEqual(left.variance, whole.variance)
+        self.assertAlmostEqual(left.percentile(50), whole.percentile(50), delta=1.5)
+
+    def test_digest_quantiles_and_bounded_size(self):
+        digest = TDigest()
+        for value in range(1, 100001):
+            digest.add(value)
+        self.assertLess(len(digest.centroids()), 500)
+        self.assertAlmostEqual(digest.quantile(0.5), 50000, delta=500)
+        self.assertAlmostEqual(digest.quantile(0.99), 99000, delta=200)
+        self.assertEqual(digest.quantile(0), 1)
+        self.assertEqual(digest.quantile(1), 100000)
+        with self.assertRaises(ValueError):
+            TDigest().quantile(0.5)
+
+    def test_aggregates_per_figure_type(self):
+        lines = "circle 1\nsquare 2\nsquare 3\ntriangle 3 4 5\n"
+        aggregator = PerimeterAggregator().consume(StreamFigureFactory(StringIO(lines), input_mode="file"))
+        summary = aggregator.summary()
+        self.assertEqual(summary["overall"]["count"], 4)
+        self.assertAlmostEqual(summary["overall"]["sum"], 6.28 + 8 + 12 + 12)
+        self.assertEqual(summary["by_type"]["square"]["count"], 2)
+        self.assertEqual(summary["by_type"]["square"]["mean"], 10)
+        self.assertEqual(summary["by_type"]["triangle"]["max"], 12)
+
+    def test_empty_summary_is_valid_json(self):
+        summary = PerimeterStats().summary()
+        self.assertEqual((summary["count"], summary["min"], summary["max"]), (0, None, None))
+        json.dumps(summary, allow_nan=False)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_batch_skips_types_without_rows(self):
+        batch = RandomFigureFactory().create_random_batch(3, seed=1)
+        present = {FigureRegistry.of(type(figure)).name for figure in batch}
+        self.assertLess(len(present), len(batch.types))
+        aggregator = PerimeterAggregator().consume([batch])
+        self.assertEqual(set(aggregator.by_type), present)
+        json.dumps(aggregator.summary(), allow_nan=False)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_batch_and_scalar_paths_agree(self):
+        batch = RandomFigureFactory().create_random_batch(5000, seed=11)
+        scalar = PerimeterAggregator().consume(batch)
+        vectorized = PerimeterAggregator().consume([batch])
+        for name, stats in scalar.by_type.items():
+            other = vectorized.by_type[name]
+            self.assertEqual(stats.count, other.count)
+            self.assertAlmostEqual(stats.mean, other.mean)
+            self.assertAlmostEqual(stats.variance, other.variance, delta=1e-6 * stats.variance)
+            self.assertAlmostEqual(stats.percentile(90), other.percentile(90), delta=0.02 * stats.maximum)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_aggregators_merge_across_shards(self):
+        first = RandomFigureFactory().create_random_batch(3000, seed=1)
+        second = RandomFigureFactory().create_random_batch(3000, seed=2)
+        merged = PerimeterAggregator().consume([first]).merge(PerimeterAggregator().consume([second]))
+        whole = PerimeterAggregator().consume([FigureBatch.concat([first, second])])
+        self.assertEqual(merged.overall.count, 6000)
+        self.assertAlmostEqual(merged.overall.mean, whole.overall.mean)
+        self.assertAlmostEqual(merged.overall.variance, whole.overall.variance, delta=1e-6 * whole.overall.variance)
+
+
+class TestArea(unittest.TestCase):
+    def test_scalar_areas(self):
+        self.assertEqual(Triangle(3, 4, 5).get_area(), 6)
+        self.assertEqual(Square(3.5).get_area(), 12.25)
+        self.assertEqual(Rectangle(3, 4).get_area(), 12)
+        self.assertAlmostEqual(Circle(3).get_area(), 28.274333882308138)
+        self.assertAlmostEqual(Circle(0.03).get_area(), 0.002827433388230814)
+
+    def test_needle_like_triangle_keeps_precision(self):
+        # Reference values from Kahan's paper, computed in exact arithmetic.
+        self.assertAlmostEqual(Triangle(100000, 99999.99979, 0.00029).get_area(), 10.0, places=6)
+        self.assertAlmostEqual(Triangle(100000, 100000, 1.00005).get_area(), 50002.50003, delta=1e-4)
+
+    def test_area_is_abstract(self):
+        class Blob(Figure):
+            def get_perimeter(self):
+                return 1
+
+        self.assertIsNone(FigureRegistry.get("blob"))
+        with self.assertRaises(TypeError):
+            Blob()
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_batch_kernels_match_scalar(self):
+        batch = RandomFigureFactory().create_random_batch(2000, seed=4)
+        areas = batch.get_area()
+        for area, figure in zip(areas.tolist(), batch):
+            self.assertAlmostEqual(area, figure.get_area(), delta=1e-9 * max(1.0, area))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_batch_heron_is_order_independent(self):
+        a, b, c = np.array([3.0, 5.0, 0.00029]), np.array([4.0, 3.0, 100000.0]), np.array([5.0, 4.0, 99999.99979])
+        self.assertTrue(np.allclose(Triangle.area_many(a, b, c), [6.0, 6.0, 10.0], rtol=1e-6))
+
+
+class TestPerimeterIndex(unittest.TestCase):
+    def setUp(self):
+        self.figures = RandomFigureFactory().create_random_figures(500)
+        self.index = PerimeterIndex(self.figures)
+
+    def test_range_matches_linear_scan(self):
+        expected = sorted(f.get_perimeter() for f in self.figures if 1000 <= f.get_perimeter() <= 3000)
+        self.assertEqual([f.get_perimeter() for f in self.index.range(1000, 3000)], expected)
+        self.assertEqual(self.index.count(1000, 3000), len(expected))
+        self.assertEqual(len(self.index.range(low=1e9)), 0)
+        self.assertEqual(len(self.index.range()), len(self.figures))
+
+    def test_top_k_and_bottom_k(self):
+        perimeters = sorted(f.get_perimeter() for f in self.figures)
+        self.assertEqual([f.get_perimeter() for f in self.index.top_k(10)], perimeters[::-1][:10])
+        self.assertEqual([f.get_perimeter() for f in self.index.bottom_k(3)], perimeters[:3])
+        self.assertEqual(self.index.top_k(0), [])
+        self.assertEqual(len(self.index.top_k(10000)), len(self.figures))
+
+    def test_rank(self):
+        perimeters = [f.get_perimeter() for f in self.figures]
+        for probe in (0, 500.5, 2500, 1e9):
+            self.assertEqual(self.index.rank(probe), sum(p < probe for p in perimeters))
+
+    def test_per_type_filters(self):
+        squares = sorted(f.get_perimeter() for f in self.figures if isinstance(f, Square))
+        self.assertEqual([f.get_perimeter() for f in self.index.range(figure_type="square")], squares)
+        self.assertEqual(self.index.count(figure_type=Square), len(squares))
+        self.assertTrue(all(isinstance(f, Square) for f in self.index.top_k(5, figure_type="Square")))
+        self.assertEqual(self.index.range(figure_type="hexagon"), [])
+        self.assertEqual(self.index.range(figure_type=int), [])
+        self.assertEqual((self.index.count(figure_type=int), self.index.rank(10, figure_type=int)), (0, 0))
+
+    def test_incremental_insert_follows_stream(self):
+        index = PerimeterIndex()
+        stream = StringIO("square 1\ncircle 2\nrectangle 1 2\ntriangle 3 4 5\n")
+        for figure in StreamFigureFactory(stream, "file"):
+            index.add(figure)
+        self.assertEqual([str(f) for f in index], ["square 1.0", "rectangle 1.0 2.0", "triangle 3.0 4.0 5.0", "circle 2.0"])
+        index.consume([[Square(0.5)], Square(10)])
+        self.assertEqual(str(index.bottom_k(1)[0]), "square 0.5")
+        self.assertEqual(index.rank(4), 1)
+        self.assertEqual(str(index.top_k(1, figure_type="square")[0]), "square 10")
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_build_from_batch(self):
+        batch = RandomFigureFactory().create_random_batch(1000, seed=11)
+        index = PerimeterIndex(batch)
+        self.assertEqual([f.get_perimeter() for f in index], sorted(batch.get_perimeter().tolist()))
+        self.assertEqual(index.count(figure_type="circle"), sum(1 for f in batch if isinstance(f, Circle)))
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestBinaryFormat(unittest.TestCase):
+    def setUp(self):
+        self.batch = RandomFigureFactory().create_random_batch(3000, seed=21)
+        handle, self.path = tempfile.mkstemp(suffix=".figb")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def assertSameBatch(self, loaded, batch):
+        self.assertEqual([str(f) for f in loaded], [str(f) for f in batch])
+        self.assertTrue(np.array_equal(loaded.get_perimeter(), batch.get_perimeter()))
+
+    def test_round_trip_from_file_is_zero_copy(self):
+        self.batch.save(self.path)
+        loaded = FigureBatch.load(self.path)
+        self.assertSameBatch(loaded, self.batch)
+        self.assertIsInstance(loaded.columns[0][0].base, np.ndarray)
+        self.assertFalse(loaded.columns[0][0].flags.writeable)
+
+    def test_compressed_round_trip(self):
+        self.batch.save(self.path, compress=True)
+        self.assertLess(os.path.getsize(self.path), len(self.batch.to_bytes()))
+        self.assertSameBatch(FigureBatch.load(self.path), self.batch)
+
+    def test_text_round_trip_preserves_exact_values(self):
+        lines = ["triangle 0.1 0.2 0.29999999999999999", "circle 1e-300", "square 12345.123456789",
+                 "rectangle 3.141592653589793 2.718281828459045"]
+        with open(self.path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        batch = MappedFigureFactory(self.path).create_batch()
+        text = [str(f) for f in batch]
+        for compress in (False, True):
+            loaded = FigureBatch.from_bytes(batch.to_bytes(compress))
+            self.assertEqual([str(f) for f in loaded], text)
+        self.assertEqual(text, [str(FigureFactory.create_figure(line)) for line in lines])
+
+    def test_empty_batch(self):
+        empty = FigureBatch.from_figures([])
+        self.assertEqual(len(FigureBatch.from_bytes(empty.to_bytes())), 0)
+
+    def test_rejects_corrupt_input(self):
+        data = bytearray(self.batch.to_bytes())
+        with self.assertRaisesRegex(ValueError, "Not a figure binary file"):
+            FigureBatch.from_bytes(b"TEXT" + bytes(data[4:]))
+        with self.assertRaisesRegex(ValueError, "truncated"):
+            FigureBatch.from_bytes(bytes(data[:-8]))
+        with self.assertRaisesRegex(ValueError, "version"):
+            FigureBatch.from_bytes(bytes(data[:4]) + b"\x09\x00" + bytes(data[6:]))
+        for size in (30, 38, 40):
+            with self.assertRaisesRegex(ValueError, "truncated"):
+                FigureBatch.from_bytes(bytes(data[:size]))
+        compressed = self.batch.to_bytes(compress=True)
+        with self.assertRaisesRegex(ValueError, "truncated"):
+            FigureBatch.from_bytes(compressed[:-20])
+
+    def test_validates_loaded_values(self):
+        batch = FigureBatch.from_figures([Square(2), Square(3)])
+        data = bytearray(batch.to_bytes())
+        data[-8:] = np.array([-1.0], dtype="<f8").tobytes()
+        with self.assertRaisesRegex(ValueError, "positive"):
+            FigureBatch.from_bytes(bytes(data))
+        self.assertEqual(FigureBatch.from_bytes(bytes(data), validate=False).columns[0][0].tolist(), [2.0, -1.0])
+
+
+class TestAsyncStreamFigureFactory(unittest.TestCase):
+    async def _connected(self, payload, **kwargs):
+        ours, theirs = socket.socketpair()
+        # Keep the reader's own writer alive; collecting it would close the socket early.
+        reader, self.reader_writer = await asyncio.open_connection(sock=ours)
+        _, writer = await asyncio.open_connection(sock=theirs)
+        writer.write(payload.encode("utf-8"))
+        await writer.drain()
+        writer.close()
+        return AsyncStreamFigureFactory(reader, **kwargs), (self.reader_writer, writer)
+
+    def collect(self, payload, **kwargs):
+        async def run():
+            factory, writers = await self._connected(payload, **kwargs)
+            figures = [str(figure) async for figure in factory]
+            await writers[1].wait_closed()
+            return figures
+        return asyncio.run(run())
+
+    def test_reads_figures_from_socket(self):
+        self.assertEqual(self.collect("square 1\ncircle 2\n\ntriangle 3 4 5\n", input_mode="file"),
+                         ["square 1.0", "circle 2.0"])
+
+    def test_same_semantics_as_sync_factory(self):
+        with redirect_stdout(StringIO()) as output:
+            self.assertEqual(self.collect("square 1\nexit\nsquare 2\n"), ["square 1.0"])
+        self.assertEqual(output.getvalue(), "Exiting program.\n")
+        with self.assertRaisesRegex(ValueError, "No input provided in STDIN!"):
+            self.collect("")
+        with self.assertRaisesRegex(OverflowError, "maximum of 2"):
+            self.collect("square 1\nsquare 2\nsquare 3\n", max_figures=2)
+        with self.assertRaisesRegex(ValueError, "Unknown or invalid figure type: Hexagon"):
+            self.collect("hexagon 1\n", input_mode="file")
+
+    def test_chunks_yield_partial_chunk_before_error(self):
+        async def run():
+            factory, writers = await self._connected("square 1\nsquare 2\nsquare 3\nsquare x\n", input_mode="file")
+            chunks = []
+            with self.assertRaises(ValueError):
+                async for chunk in factory.iter_figures(chunk_size=2):
+                    chunks.append([str(figure) for figure in chunk])
+            await writers[1].wait_closed()
+            return chunks, factory.bytes_read
+        chunks, bytes_read = asyncio.run(run())
+        self.assertEqual(chunks, [["square 1.0", "square 2.0"], ["square 3.0"]])
+        self.assertEqual(bytes_read, 36)
+
+    def test_many_streams_on_one_loop(self):
+        async def run():
+            factories, writers = [], []
+            for i in range(20):
+                factory, pair = await self._connected("".join(f"square {i + j + 1}\n" for j in range(50)), input_mode="file")
+                factories.append(factory)
+                writers.append(pair)
+
+            async def drain(factory):
+                return [figure async for figure in factory]
+            return await asyncio.gather(*(drain(factory) for factory in factories))
+        results = asyncio.run(run())
+        self.assertEqual([len(figures) for figures in results], [50] * 20)
+        self.assertEqual(str(results[3][0]), "square 4.0")
+
+    def test_sync_iteration_is_rejected(self):
+        async def run():
+            with self.assertRaises(TypeError):
+                iter(AsyncStreamFigureFactory(asyncio.StreamReader()))
+        asyncio.run(run())
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def run_main(self, *argv, stdin=""):
+        with patch("sys.stdin", StringIO(stdin)), redirect_stdout(StringIO()) as output, \
+                redirect_stderr(StringIO()) as errors:
+            status = main(list(argv))
+        return status, output.getvalue(), errors.getvalue()
+
+    def test_text_from_file_and_stdin(self):
+        with open(self.path, "w") as file:
+            file.write("square 1\ncircle 2\n")
+        self.assertEqual(self.run_main("--input", self.path), (0, "square 1.0\ncircle 2.0\n", ""))
+        self.assertEqual(self.run_main("--input", "-", stdin="rectangle 1 2\n")[:2], (0, "rectangle 1.0 2.0\n"))
+
+    def run_process(self, *argv, **kwargs):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return subprocess.Popen([sys.executable, "-m", "Figures.Code.figures", *argv], cwd=root, **kwargs)
+
+    def test_closed_pipe_exits_quietly(self):
+        process = self.run_process("--random", "200000", stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        process.stdout.readline()
+        process.stdout.close()
+        errors = process.stderr.read()
+        process.stderr.close()
+        self.assertEqual(process.wait(), 1)
+        self.assertEqual(errors, b"")
+
+    @unittest.skipIf(sys.platform == "win32", "select() does not work on pipes")
+    def test_stdin_output_follows_a_slow_feed(self):
+        process = self.run_process("--input", "-", stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            process.stdin.write(b"square 1\n")
+            process.stdin.flush()
+            self.assertTrue(select.select([process.stdout], [], [], 10)[0])
+            self.assertEqual(process.stdout.readline(), b"square 1.0\n")
+        finally:
+            process.stdin.close()
+            process.stdout.close()
+            process.wait()
+
+    @unittest.skipIf(sys.platform == "win32", "select() does not work on pipes")
+    def test_pipe_reader_keeps_line_breaks_split_across_reads(self):
+        read_end, write_end = os.pipe()
+        reader = PipeLineReader(read_end)
+        try:
+            self.assertTrue(reader.would_block())
+            os.write(write_end, b"square 1\r")
+            self.assertFalse(reader.would_block())
+            os.write(write_end, b"\ncircle 2\rsquare 3")
+            os.close(write_end)
+            self.assertEqual([reader.readline() for _ in range(4)], [b"square 1\r\n", b"circle 2\r", b"square 3", b""])
+        finally:
+            os.close(read_end)
+
+    def test_exit_line_keeps_stdout_clean(self):
+        status, output, errors = self.run_main("--input", "-", "--format", "json", stdin="square 1\nexit\nsquare 2\n")
+        self.assertEqual((status, errors), (0, "Exiting program.\n"))
+        self.assertEqual([json.loads(line)["dimensions"] for line in output.splitlines()], [[1.0]])
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_exit_line_with_binary_output(self):
+        output = BytesIO()
+        stdout = TextIOWrapper(output, write_through=True)
+        with patch("sys.stdin", StringIO("square 1\nexit\n")), patch("sys.stdout", stdout), \
+                redirect_stderr(StringIO()):
+            self.assertEqual(main(["--input", "-", "--format", "binary"]), 0)
+        stdout.detach()
+        self.assertTrue(output.getvalue().startswith(b"FIGB"))
+        self.assertEqual([str(f) for f in FigureBatch.from_bytes(output.getvalue())], ["square 1.0"])
+
+    def test_json_output_and_stats(self):
+        status, output, errors = self.run_main("--input", "-", "--format", "json", "--stats",
+                                               stdin="square 1\ntriangle 3 4 5\n")
+        self.assertEqual(status, 0)
+        self.assertEqual([json.loads(line) for line in output.splitlines()], [
+            {"type": "square", "dimensions": [1.0], "perimeter": 4.0},
+            {"type": "triangle", "dimensions": [3.0, 4.0, 5.0], "perimeter": 12.0},
+        ])
+        summary = json.loads(errors)
+        self.assertEqual(summary["overall"]["count"], 2)
+        self.assertEqual(summary["by_type"]["triangle"]["sum"], 12.0)
+
+    def test_errors_go_to_stderr_after_partial_output(self):
+        status, output, errors = self.run_main("--input", "-", "--chunk-size", "1", stdin="square 1\nsquare -1\n")
+        self.assertEqual((status, output), (1, "square 1.0\n"))
+        self.assertEqual(errors, "Error: a must be positive and non-zero!\n")
+        self.assertEqual(self.run_main("--input", "missing/file.txt")[0], 1)
+        self.assertEqual(self.run_main("--input", "-", "--max-figures", "1", stdin="square 1\nsquare 2\n")[0], 1)
+
+    def test_random_is_reproducible_with_seed(self):
+        first = self.run_main("--random", "50", "--seed", "7", "--chunk-size", "8")
+        second = self.run_main("--random", "50", "--seed", "7", "--chunk-size", "8")
+        self.assertEqual(first, second)
+        self.assertEqual(len(first[1].splitlines()), 50)
+        figures = [FigureFactory.create_figure(line) for line in first[1].splitlines()]
+        self.assertEqual(len(figures), 50)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_binary_output(self):
+        status, output, _ = self.run_main("--input", "-", "--format", "binary", "--output", self.path,
+                                          stdin="square 1\ncircle 2.5\n")
+        self.assertEqual((status, output), (0, ""))
+        self.assertEqual([str(f) for f in FigureBatch.load(self.path)], ["square 1.0", "circle 2.5"])
+
+    def test_random_count_must_be_positive(self):
+        for count in ("0", "-5"):
+            self.assertEqual(self.run_main("--random", count),
+                             (2, "", "Error: The number of figures must be positive!\n"))
+
+    def test_requires_a_source(self):
+        with redirect_stderr(StringIO()), self.assertRaises(SystemExit):
+            main(["--format", "json"])
+
+
+class TestFigureWriter(unittest.TestCase):
+    class CountingStream(StringIO):
+        def __init__(self):
+            super().__init__()
+            self.writes = 0
+
+        def write(self, text):
+            self.writes += 1
+            return super().write(text)
+
+    def test_buffers_until_threshold(self):
+        stream = self.CountingStream()
+        writer = FigureWriter(stream, prefix="Created figure: ", buffer_size=64)
+        writer.write(Square(1.0))
+        self.assertEqual(stream.writes, 0)
+        writer.write_many([Circle(2.0), Rectangle(1.0, 2.0), Triangle(3.0, 4.0, 5.0)])
+        self.assertEqual(stream.writes, 1)
+        writer.flush()
+        self.assertEqual(stream.getvalue(), "Created figure: square 1.0\nCreated figure: circle 2.0\n"
+                                            "Created figure: rectangle 1.0 2.0\nCreated figure: triangle 3.0 4.0 5.0\n")
+        self.assertEqual(writer.figures_written, 4)
+
+    def test_failed_write_drops_pending_text(self):
+        class ClosedPipe(self.CountingStream):
+            def write(self, text):
+                super().write(text)
+                raise BrokenPipeError
+
+        stream = ClosedPipe()
+        writer = FigureWriter(stream)
+        writer.write(Square(1.0))
+        with self.assertRaises(BrokenPipeError):
+            writer.flush()
+        writer.flush()
+        self.assertEqual(stream.writes, 1)
+
+    def test_context_manager_flushes(self):
+        stream = StringIO()
+        with FigureWriter(stream) as writer:
+            writer.write_chunk([Square(2.5)])
+            writer.write_many([])
+        self.assertEqual(stream.getvalue(), "square 2.5\n")
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_batch_formatting_matches_str(self):
+        batch = RandomFigureFactory().create_random_batch(5000, seed=8)
+        self.assertEqual(batch.format_lines(), [str(figure) for figure in batch])
+        stream = StringIO()
+        with FigureWriter(stream, prefix="> ") as writer:
+            writer.write_chunk(batch)
+        self.assertEqual(stream.getvalue().splitlines(), ["> " + str(figure) for figure in batch])
+
+    def test_interactive_main_streams_figures(self):
+        with open("stream_test.txt", "w") as file:
+            file.write("square 1\ncircle 2\nsquare -1\n")
+        try:
+            with patch("builtins.input", side_effect=["1", "stream_test.txt"]), redirect_stdout(StringIO()) as output:
+                main([])
+        finally:
+            os.remove("stream_test.txt")
+        self.assertEqual(output.getvalue().splitlines()[-3:], [
+            "Created figure: square 1.0", "Created figure: circle 2.0", "Error: a must be positive and non-zero!"])
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_runs_every_benchmark(self):
+        from Figures.Benchmarks.benchmarks import run_suite, SUITE
+        results = run_suite(sizes=(20,), repeat=1)
+        self.assertEqual(set(results), set(SUITE))
+        self.assertTrue(all(rates["20"] > 0 for rates in results.values()))
+
+    def test_compare_flags_only_drops_past_threshold(self):
+        from Figures.Benchmarks.benchmarks import compare_results
+        baseline = {"clone": {"1000": 100.0, "10000": 100.0}, "random": {"1000": 50.0}}
+        results = {"clone": {"1000": 85.0, "10000": 70.0}, "random": {"1000": 10.0}, "stream": {"1000": 1.0}}
+        self.assertEqual(compare_results(results, baseline, threshold=0.2),
+                         [("clone", 10000, 100.0, 70.0), ("random", 1000, 50.0, 10.0)])
+
+
+class TestStageTimer(unittest.TestCase):
+    def ticking_clock(self):
+        ticks = iter(range(10 ** 6))
+        return lambda: next(ticks)
+
+    def test_records_every_stage(self):
+        timer = StageTimer(clock=self.ticking_clock())
+        factory = StreamFigureFactory(StringIO("square 1\ncircle 2\n"), "file", timer=timer)
+        with FigureWriter(StringIO(), timer=timer) as writer:
+            for chunk in factory.iter_figures(chunk_size=10):
+                writer.write_many(chunk)
+        self.assertEqual(timer.calls, {"read": 3, "tokenize": 2, "lookup": 2, "validate": 2, "format": 1})
+        self.assertEqual(timer.seconds["tokenize"], 2)
+        self.assertEqual(set(timer.summary()), set(StageTimer.STAGES))
+        self.assertIn("validate", timer.report())
+
+    def test_failures_are_timed_and_reraised(self):
+        timer = StageTimer()
+        with self.assertRaisesRegex(ValueError, "Unknown or invalid figure type: Hexagon"):
+            FigureFactory.create_figure("hexagon 1", timer=timer)
+        with self.assertRaisesRegex(ValueError, "positive"):
+            FigureFactory.create_figure("square -1", timer=timer)
+        self.assertEqual(timer.calls["lookup"], 2)
+        self.assertEqual(timer.calls["validate"], 1)
+
+    def test_timed_path_matches_untimed(self):
+        pool, cache = FigureInternPool(), ParseCache()
+        lines = ["square 1", "square 1", "rectangle 1 2", "Triangle  3 4 5"]
+        timed = [FigureFactory.create_figure(line, pool=pool, cache=cache, timer=StageTimer()) for line in lines]
+        self.assertEqual(timed, [FigureFactory.create_figure(line) for line in lines])
+        self.assertIs(timed[0], timed[1])
+
+    def test_cli_reports(self):
+        directory = tempfile.mkdtemp()
+        profile, allocations = os.path.join(directory, "profile.txt"), os.path.join(directory, "memory.txt")
+        with patch("sys.stdin", StringIO("square 1\ncircle 2\n")), redirect_stdout(StringIO()), \
+                redirect_stderr(StringIO()) as errors:
+            status = main(["--input", "-", "--timings", "--profile", profile, "--tracemalloc", allocations])
+        self.assertEqual(status, 0)
+        self.assertIn("tokenize", errors.getvalue())
+        with open(profile) as report:
+            self.assertIn("cumulative", report.read())
+        with open(allocations) as report:
+            self.assertIn("peak:", report.read())
+        for path in (profile, allocations):
+            os.remove(path)
+        os.rmdir(directory)
+
+
+class TestCompactFigures(unittest.TestCase):
+    def test_figures_have_no_instance_dict(self):
+        for figure in (Triangle(3, 4, 5), Square(1), Rectangle(1, 2), Circle(1)):
+            self.assertFalse(hasattr(figure, "__dict__"))
+            with self.assertRaises(AttributeError):
+                figure.colour = "red"
+
+    def bytes_per_figure(self, build, rows):
+        gc.collect()
+        gc.disable()
+        tracemalloc.start()
+        try:
+            figures = [build(*row) for row in rows]
+            current, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            gc.enable()
+        return current / len(figures)
+
+    def test_memory_ceiling_for_a_million_figures(self):
+        # Dimensions are allocated up front so only the figures and the list are traced:
+        # a slot-only figure plus its list entry costs 56 (one field) to 72 bytes (three).
+        count = 1000000
+        sides = [(float(i) + 0.5,) for i in range(count)]
+        self.assertLessEqual(self.bytes_per_figure(Square, sides), 64)
+        triangles = [(side + 2.0, side + 3.0, side + 4.0) for side, in sides]
+        del sides
+        self.assertLessEqual(self.bytes_per_figure(Triangle, triangles), 80)
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets are not available")
+class TestFigureServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "figures.sock")
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rmdir(self.directory)
+
+    def serve(self, client):
+        async def run():
+            server = await FigureServer(self.path).start()
+            try:
+                return await client(server)
+            finally:
+                server.close()
+        return asyncio.run(run())
+
+    def test_responds_with_figure_perimeter_or_error(self):
+        server = FigureServer(self.path)
+        self.assertEqual(server.respond("square 1"), "ok\tsquare 1.0\t4.0")
+        self.assertEqual(server.respond("hexagon 1"), "error\tValueError\tUnknown or invalid figure type: Hexagon")
+        self.assertEqual(server.respond("triangle 1 1 5"), "error\tValueError\tTriangle inequality is violated!")
+        self.assertEqual((server.requests, server.errors), (3, 2))
+
+    def test_concurrent_clients_and_batches(self):
+        async def client(server):
+            async def talk(i):
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                writer.write("".join(f"square {i + j + 1}\n" for j in range(100)).encode() + b"circle 1")
+                writer.write_eof()
+                responses = (await reader.read()).decode().splitlines()
+                writer.close()
+                return responses
+            results = await asyncio.gather(*(talk(i) for i in range(10)))
+            return results, server.cache.info()
+        results, cache = self.serve(client)
+        self.assertEqual([len(responses) for responses in results], [101] * 10)
+        self.assertEqual(results[2][0], "ok\tsquare 3.0\t12.0")
+        self.assertEqual(results[2][-1], "ok\tcircle 1.0\t6.28")
+        self.assertGreater(cache["hits"], 0)
+
+    def test_does_not_remove_other_files(self):
+        with open(self.path, "w") as file:
+            file.write("precious")
+        with self.assertRaises(FileExistsError):
+            asyncio.run(FigureServer(self.path).start())
+        with open(self.path) as file:
+            self.assertEqual(file.read(), "precious")
+        with redirect_stderr(StringIO()) as errors:
+            self.assertEqual(main(["--serve", self.path]), 1)
+        self.assertIn("not a socket", errors.getvalue())
+        self.assertTrue(os.path.isfile(self.path))
+
+    def test_replaces_stale_socket_and_removes_only_its_own(self):
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(self.path)
+        stale.close()
+
+        async def run():
+            server = await FigureServer(self.path).start()
+            os.remove(self.path)
+            with open(self.path, "w") as file:
+                file.write("replaced")
+            server.close()
+        asyncio.run(run())
+        with open(self.path) as file:
+            self.assertEqual(file.read(), "replaced")
+
+    def test_thin_client(self):
+        async def client(server):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, FigureClient(self.path).request, ["square 2", "square -2", "rectangle 1 2"])
+        self.assertEqual(self.serve(client), [
+            "ok\tsquare 2.0\t8.0", "error\tValueError\ta must be positive and non-zero!", "ok\trectangle 1.0 2.0\t6.0"])
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestSkipAndReport(unittest.TestCase):
+    LINES = "square 1\nsquare -1\nhexagon 2\ncircle 2\ntriangle 1 1 1000000000\nrectangle 1 2\n"
+
+    def test_rejected_lines_are_quarantined(self):
+        sidecar = StringIO()
+        quarantine = Quarantine(sidecar)
+        factory = StreamFigureFactory(StringIO(self.LINES), "file", quarantine=quarantine)
+        self.assertEqual([str(f) for f in factory], ["square 1.0", "circle 2.0", "rectangle 1.0 2.0"])
+        self.assertEqual([json.loads(line) for line in sidecar.getvalue().splitlines()], [
+            {"line": 2, "text": "square -1", "error": "ValueError", "message": "a must be positive and non-zero!"},
+            {"line": 3, "text": "hexagon 2", "error": "ValueError", "message": "Unknown or invalid figure type: Hexagon"},
+            {"line": 5, "text": "triangle 1 1 1000000000", "error": "OverflowError", "message": "Dimensions are too big!"},
+        ])
+        self.assertEqual((factory.line_number, factory.figure_count), (6, 3))
+        quarantine.check(factory.line_number)
+        self.assertEqual(quarantine.summary(), {"lines": 6, "rejected": 3, "error_rate": 0.5,
+                                                "by_error": {"ValueError": 2, "OverflowError": 1}})
+        self.assertEqual(quarantine.report(), "Rejected 3 of 6 lines (50.00%) - ValueError: 2, OverflowError: 1")
+
+    def test_default_mode_still_stops_at_first_error(self):
+        factory = StreamFigureFactory(StringIO(self.LINES), "file")
+        self.assertEqual(str(factory.create_figure()), "square 1.0")
+        with self.assertRaises(ValueError):
+            factory.create_figure()
+        self.assertEqual(factory.line_number, 2)
+
+    def test_structural_errors_are_not_skipped(self):
+        with self.assertRaisesRegex(ValueError, "No input provided in file!"):
+            list(StreamFigureFactory(StringIO(""), "file", quarantine=Quarantine()))
+        with self.assertRaisesRegex(OverflowError, "maximum of 2"):
+            list(StreamFigureFactory(StringIO("square 1\nsquare x\nsquare 2\nsquare 3\n"), "file",
+                                     max_figures=2, quarantine=Quarantine()))
+
+    def test_error_rate_limit(self):
+        lines = "".join("square -1\n" if i % 10 == 0 else "square 1\n" for i in range(2000))
+        quarantine = Quarantine(max_error_rate=0.05, min_lines=100)
+        with self.assertRaisesRegex(OverflowError, "exceeded the maximum of 5.00%"):
+            list(StreamFigureFactory(StringIO(lines), "file", max_figures=None, quarantine=quarantine))
+        self.assertLess(quarantine.lines, 200)
+        tolerant = Quarantine(max_error_rate=0.15)
+        list(StreamFigureFactory(StringIO(lines), "file", max_figures=None, quarantine=tolerant))
+        with self.assertRaises(ValueError):
+            Quarantine(max_error_rate=2)
+
+    def test_cli_flags(self):
+        handle, sidecar = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            with patch("sys.stdin", StringIO(self.LINES)), redirect_stdout(StringIO()) as output, \
+                    redirect_stderr(StringIO()) as errors:
+                status = main(["--input", "-", "--quarantine", sidecar])
+            self.assertEqual(status, 0)
+            self.assertEqual(output.getvalue(), "square 1.0\ncircle 2.0\nrectangle 1.0 2.0\n")
+            self.assertIn("Rejected 3 of 6 lines", errors.getvalue())
+            with open(sidecar) as file:
+                self.assertEqual(len(file.read().splitlines()), 3)
+
+            with patch("sys.stdin", StringIO(self.LINES)), redirect_stdout(StringIO()), \
+                    redirect_stderr(StringIO()) as errors:
+                status = main(["--input", "-", "--max-error-rate", "0.25"])
+            self.assertEqual(status, 1)
+            self.assertIn("exceeded the maximum of 25.00%", errors.getvalue())
+        finally:
+            os.remove(sidecar)